@@ -1,9 +1,12 @@
+import asyncio
+import functools
 import json
 import os
 import re
 import secrets
 import smtplib
 import sqlite3
+import threading
 import time
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
@@ -48,6 +51,7 @@ BASE_URL = os.getenv("BASE_URL", "http://localhost:8080")  # For verification li
 
 _RATE_LIMIT = {}
 _SESSIONS = {}
+_FOLDER_IDS = {}  # (parent_id, name) -> Drive folder id, so each folder is looked up once per process
 
 
 # --- Database Setup for Self-Registration ---
@@ -259,6 +263,12 @@ def load_token_map() -> Dict[str, Dict[str, str]]:
     return json.loads(TOKEN_MAP_PATH.read_text(encoding="utf-8"))
 
 
+# Credentials and the Drive client are built once per process, and upload sessions once per
+# thread: parsing the key, fetching the discovery document and opening TLS connections used to
+# happen on every request and every chunk. Both clients refresh the token themselves when it
+# expires. The Drive client is only used from the async routes on the event loop thread; chunk
+# PUTs run in worker threads, which is why authorized_session() is per thread.
+@functools.lru_cache(maxsize=1)
 def get_credentials():
     if SERVICE_ACCOUNT_JSON:
         data = json.loads(SERVICE_ACCOUNT_JSON)
@@ -274,8 +284,9 @@ def get_credentials():
     raise RuntimeError("SERVICE_ACCOUNT_JSON_PATH or SERVICE_ACCOUNT_JSON required")
 
 
+@functools.lru_cache(maxsize=1)
 def drive_service():
-    return build("drive", "v3", credentials=get_credentials())
+    return build("drive", "v3", credentials=get_credentials(), cache_discovery=False)
 
 
 def load_sessions() -> Dict[str, dict]:
@@ -294,6 +305,10 @@ def save_sessions():
 
 
 def ensure_folder(service, parent_id: str, name: str) -> str:
+    # The app never deletes folders, so a resolved id stays valid for the life of the process
+    cached = _FOLDER_IDS.get((parent_id, name))
+    if cached:
+        return cached
     # Escape single quotes in folder name to prevent query injection
     safe_name = name.replace("'", "\\'")
     query = (
@@ -303,12 +318,15 @@ def ensure_folder(service, parent_id: str, name: str) -> str:
     result = service.files().list(q=query, fields="files(id, name)").execute()
     files = result.get("files", [])
     if files:
-        return files[0]["id"]
-    folder = service.files().create(
-        body={"name": name, "mimeType": "application/vnd.google-apps.folder", "parents": [parent_id]},
-        fields="id",
-    ).execute()
-    return folder["id"]
+        folder_id = files[0]["id"]
+    else:
+        folder = service.files().create(
+            body={"name": name, "mimeType": "application/vnd.google-apps.folder", "parents": [parent_id]},
+            fields="id",
+        ).execute()
+        folder_id = folder["id"]
+    _FOLDER_IDS[(parent_id, name)] = folder_id
+    return folder_id
 
 
 def ensure_schema(service):
@@ -322,8 +340,16 @@ def contributor_folder_id(service, folder_name: str) -> str:
     return ensure_folder(service, schema["INBOX_UPLOADS"], folder_name)
 
 
+_session_local = threading.local()
+
+
 def authorized_session():
-    return AuthorizedSession(get_credentials())
+    # requests.Session is not thread-safe, so each thread keeps its own and its chunk PUTs
+    # still reuse pooled connections to googleapis.com
+    session = getattr(_session_local, "session", None)
+    if session is None:
+        session = _session_local.session = AuthorizedSession(get_credentials())
+    return session
 
 
 def start_resumable_session(file_name: str, mime_type: str, parent_id: str, size_bytes: int | None) -> str:
@@ -581,17 +607,18 @@ async def api_upload_chunk(request: Request):
             expected = _SESSIONS[upload_id].get("offset", 0)
         if expected is not None and start != expected:
             # Query Drive for the latest offset to recover from mismatch.
-            next_offset = query_upload_status(session_url, total)
+            next_offset = await asyncio.to_thread(query_upload_status, session_url, total)
             _SESSIONS[upload_id]["offset"] = next_offset
             _SESSIONS[upload_id]["updated_at"] = datetime.utcnow().isoformat()
             save_sessions()
             return JSONResponse(content={"status": "resume", "next_offset": next_offset}, status_code=308)
         if expected is None and start > 0:
-            next_offset = query_upload_status(session_url, total)
+            next_offset = await asyncio.to_thread(query_upload_status, session_url, total)
             return JSONResponse(content={"status": "resume", "next_offset": next_offset}, status_code=308)
 
     body = await request.body()
-    resp = upload_chunk(session_url, body, content_range, content_type)
+    # The PUT sends the whole chunk to Drive; off the loop so other uploads keep moving
+    resp = await asyncio.to_thread(upload_chunk, session_url, body, content_range, content_type)
 
     if resp.status_code in (200, 201):
         if upload_id and upload_id in _SESSIONS:
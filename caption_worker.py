@@ -15,7 +15,7 @@ SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 
 def get_drive_service():
     creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    return build('drive', 'v3', credentials=creds)
+    return build('drive', 'v3', credentials=creds, cache_discovery=False)
 
 def get_db_connection():
     return sqlite3.connect(DB_PATH)
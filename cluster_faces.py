@@ -9,19 +9,25 @@ DB_PATH = r'F:\FamilyArchive\data\archive.db'
 def get_db_connection():
     return sqlite3.connect(DB_PATH)
 
+def decode_embedding(blob, emb_dtype):
+    # face_worker stores float16 now; older rows are float32. Cluster in float32 either way.
+    return np.frombuffer(blob, dtype=emb_dtype or 'float32').astype(np.float32)
+
 def cluster_faces():
     conn = get_db_connection()
     cursor = conn.cursor()
     
     # Fetch all faces and their embeddings
-    faces = cursor.execute("SELECT id, embedding FROM faces").fetchall()
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(faces)")}
+    dtype_column = "emb_dtype" if "emb_dtype" in columns else "NULL"
+    faces = cursor.execute(f"SELECT id, embedding, {dtype_column} FROM faces").fetchall()
     
     if not faces:
         print("No faces found to cluster.")
         return
         
     ids = [f[0] for f in faces]
-    embeddings = [np.frombuffer(f[1], dtype=np.float32) for f in faces]
+    embeddings = [decode_embedding(f[1], f[2]) for f in faces]
     
     print(f"Clustering {len(embeddings)} faces...")
     
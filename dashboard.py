@@ -3,9 +3,14 @@ Family Archive Vault - Dashboard
 Phase 1: Basic web interface for reviewing media
 """
 
-from flask import Flask, render_template_string, jsonify, request, redirect, url_for, Response
+from flask import Flask, render_template_string, request, redirect, url_for, Response, send_file
 import sqlite3
 import json
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 from google.oauth2 import service_account
@@ -13,6 +18,11 @@ from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 import io
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 app = Flask(__name__)
 
 # Configuration
@@ -20,6 +30,11 @@ BASE_DIR = Path(r"F:\FamilyArchive")
 DATABASE_FILE = BASE_DIR / "data" / "archive.db"
 FOLDER_IDS_FILE = BASE_DIR / "config" / "drive_folders.json"
 SERVICE_ACCOUNT_FILE = BASE_DIR / "config" / "service-account.json"
+THUMBNAIL_CACHE_CONTROL = "public, max-age=86400, immutable"
+PAGE_SIZE = 50
+THUMBNAIL_CACHE_DIR = BASE_DIR / "cache" / "thumbnails"
+THUMBNAIL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+DRIVE_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
 
 # Load folder IDs
 with open(FOLDER_IDS_FILE) as f:
@@ -28,13 +43,74 @@ with open(FOLDER_IDS_FILE) as f:
 # Setup Google Drive API
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 credentials = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-drive_service = build('drive', 'v3', credentials=credentials)
+_drive_local = threading.local()
+
+# Background pool for warming the thumbnail cache ahead of <img> requests
+PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=16)
+# drive_id -> Future of a download in progress, so a prefetch and an <img> request share one fetch
+_THUMBNAIL_DOWNLOADS = {}
+_THUMBNAIL_DOWNLOADS_LOCK = threading.Lock()
+
+
+def get_drive_service():
+    """Return this thread's Drive client (the underlying httplib2 transport is not thread-safe)."""
+    service = getattr(_drive_local, "service", None)
+    if service is None:
+        service = build('drive', 'v3', credentials=credentials)
+        _drive_local.service = service
+    return service
+
+
+def ojson(obj, status=200):
+    """jsonify() replacement that encodes with orjson when it is installed."""
+    if orjson is not None:
+        body = orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC)
+    else:
+        body = json.dumps(obj, default=str)
+    return Response(body, status=status, mimetype="application/json")
+
 
 def get_db():
     conn = sqlite3.connect(DATABASE_FILE)
     conn.row_factory = sqlite3.Row
     return conn
 
+
+# Virtual generated columns the gallery reads instead of computing per card in Jinja
+GENERATED_MEDIA_COLUMNS = {
+    # '' rather than NULL when both dates are missing, so (order_date, id) keyset cursors can reach those rows
+    "order_date": "TEXT GENERATED ALWAYS AS (COALESCE(uploaded_at, created_at, '')) VIRTUAL",
+    "size_kb": "INTEGER GENERATED ALWAYS AS (COALESCE(size_bytes, 0) / 1024) VIRTUAL",
+    "uploaded_date_short": "TEXT GENERATED ALWAYS AS (substr(uploaded_at, 1, 10)) VIRTUAL",
+}
+
+
+def ensure_schema():
+    """Add the gallery's generated columns and sort index if the worker schema predates them."""
+    conn = get_db()
+    cols = {row["name"] for row in conn.execute("PRAGMA table_xinfo(media)")}
+    schema_sql = dict(conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE name IN ('media', 'ix_media_status_date')"
+    ).fetchall())
+    if "order_date" in cols and GENERATED_MEDIA_COLUMNS["order_date"] not in schema_sql["media"]:
+        # Earlier NULL-able definition; a virtual column is dropped without rewriting the table
+        conn.execute("DROP INDEX IF EXISTS ix_media_status_date")
+        conn.execute("ALTER TABLE media DROP COLUMN order_date")
+        cols.discard("order_date")
+        schema_sql.pop("ix_media_status_date", None)
+    for name, definition in GENERATED_MEDIA_COLUMNS.items():
+        if name not in cols:
+            conn.execute(f"ALTER TABLE media ADD COLUMN {name} {definition}")
+    if "id DESC" not in (schema_sql.get("ix_media_status_date") or "id DESC"):
+        # Rebuild the older index without the id tie-break the gallery sorts on
+        conn.execute("DROP INDEX ix_media_status_date")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_media_status_date ON media(status, order_date DESC, id DESC)")
+    conn.commit()
+    conn.close()
+
+
+ensure_schema()
+
 # HTML Templates
 LAYOUT = """
 <!DOCTYPE html>
@@ -119,6 +195,10 @@ LAYOUT = """
             text-align: center; padding: 60px 20px; color: #94a3b8;
         }
         .empty-state h2 { margin-bottom: 10px; }
+        .pagination {
+            display: flex; gap: 15px; align-items: center; justify-content: center;
+            margin-top: 30px; color: #94a3b8;
+        }
         .refresh-btn {
             background: #e94560; color: white; padding: 12px 24px;
             border: none; border-radius: 5px; cursor: pointer;
@@ -172,49 +252,102 @@ DASHBOARD_CONTENT = """
    style="margin-left: 15px; color: #3b82f6;">Open INBOX in Drive &rarr;</a>
 """
 
-MEDIA_LIST_CONTENT = """
-<h2 style="margin-bottom: 20px;">{{ title }} ({{ items|length }})</h2>
-{% if items %}
-<div class="media-grid">
-    {% for item in items %}
-    <div class="media-card">
-        <div class="preview">
-            {% if item.mime_type and item.mime_type.startswith('image/') %}
-            <img src="/thumbnail/{{ item.drive_id }}" alt="{{ item.filename }}" loading="lazy">
-            {% elif item.mime_type and item.mime_type.startswith('video/') %}
-            <span>&#127909; Video: {{ item.filename[:20] }}...</span>
-            {% else %}
-            <span>{{ item.mime_type or 'Unknown' }}</span>
-            {% endif %}
-        </div>
-        <div class="info">
-            <div class="filename" title="{{ item.filename }}">{{ item.filename }}</div>
-            <div class="meta">
-                <span class="status-badge status-{{ item.status }}">{{ item.status }}</span><br>
-                Size: {{ (item.size_bytes or 0) // 1024 }} KB<br>
-                Uploaded: {{ item.uploaded_at[:10] if item.uploaded_at else 'Unknown' }}
-            </div>
-            <div class="actions">
-                <a href="https://drive.google.com/file/d/{{ item.drive_id }}/view" target="_blank" class="btn btn-view">View</a>
-                {% if item.status == 'pending' %}
-                <form action="/approve/{{ item.id }}" method="post" style="display:inline;">
-                    <button type="submit" class="btn btn-approve">Approve</button>
-                </form>
-                <form action="/reject/{{ item.id }}" method="post" style="display:inline;">
-                    <button type="submit" class="btn btn-reject">Reject</button>
-                </form>
-                {% endif %}
-            </div>
-        </div>
-    </div>
-    {% endfor %}
-</div>
-{% else %}
-<div class="empty-state">
-    <h2>No items found</h2>
-    <p>{% if status == 'pending' %}Upload files to the INBOX folder to get started.{% endif %}</p>
-</div>
-{% endif %}
+GALLERY_SHELL_CONTENT = """
+<div id="gallery"></div>
+<script>
+    // Static shell: the list routes all serve this page and render from /api/items
+    const STATUS = location.pathname.slice(1);
+    const TITLES = {pending: "Pending Review", approved: "Approved Items", rejected: "Rejected Items"};
+    document.querySelectorAll("nav a").forEach(a => a.classList.toggle("active", a.getAttribute("href") === location.pathname));
+
+    function el(tag, attrs, ...children) {
+        const node = document.createElement(tag);
+        Object.entries(attrs || {}).forEach(([k, v]) => node.setAttribute(k, v));
+        node.append(...children);
+        return node;
+    }
+
+    function actionForm(action, id, label, cls) {
+        return el("form", {action: `/${action}/${id}`, method: "post", style: "display:inline;"},
+            el("button", {type: "submit", class: `btn ${cls}`}, label));
+    }
+
+    function isImage(item) {
+        return item.mime_type && item.mime_type.startsWith("image/");
+    }
+
+    function renderCard(item) {
+        let preview;
+        if (isImage(item)) {
+            preview = el("img", {src: `/thumbnail/${item.drive_id}`, alt: item.filename, loading: "lazy"});
+        } else if (item.mime_type && item.mime_type.startsWith("video/")) {
+            preview = el("span", {}, `\\u{1F3A5} Video: ${item.filename.slice(0, 20)}...`);
+        } else {
+            preview = el("span", {}, item.mime_type || "Unknown");
+        }
+
+        const actions = el("div", {class: "actions"},
+            el("a", {href: `https://drive.google.com/file/d/${item.drive_id}/view`, target: "_blank", class: "btn btn-view"}, "View"));
+        if (item.status === "pending") {
+            actions.append(actionForm("approve", item.id, "Approve", "btn-approve"),
+                           actionForm("reject", item.id, "Reject", "btn-reject"));
+        }
+
+        return el("div", {class: "media-card"},
+            el("div", {class: "preview"}, preview),
+            el("div", {class: "info"},
+                el("div", {class: "filename", title: item.filename}, item.filename),
+                el("div", {class: "meta"},
+                    el("span", {class: `status-badge status-${item.status}`}, item.status), el("br"),
+                    `Size: ${item.size_kb} KB`, el("br"),
+                    `Uploaded: ${item.uploaded_date_short || "Unknown"}`),
+                actions));
+    }
+
+    function pageLink(label, query) {
+        const link = el("a", {href: `?${new URLSearchParams(query)}`, class: "btn btn-view"}, label);
+        link.addEventListener("click", e => {
+            e.preventDefault();
+            history.pushState(null, "", link.href);
+            loadPage();
+        });
+        return link;
+    }
+
+    async function loadPage() {
+        const params = new URLSearchParams(location.search);
+        params.set("status", STATUS);
+        const data = await (await fetch(`/api/items?${params}`)).json();
+
+        const root = document.getElementById("gallery");
+        root.replaceChildren(el("h2", {style: "margin-bottom: 20px;"}, `${TITLES[STATUS]} (${data.total})`));
+        if (!data.items.length) {
+            root.append(el("div", {class: "empty-state"},
+                el("h2", {}, "No items found"),
+                el("p", {}, STATUS === "pending" ? "Upload files to the INBOX folder to get started." : "")));
+            return;
+        }
+
+        // Queue the whole page for download; an <img> request for a file in flight waits on that fetch
+        fetch("/api/prefetch", {
+            method: "POST",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({drive_ids: data.items.filter(isImage).map(item => item.drive_id)})
+        });
+        root.append(el("div", {class: "media-grid"}, ...data.items.map(renderCard)));
+
+        if (data.total_pages > 1) {
+            const nav = el("div", {class: "pagination"});
+            if (data.page > 1) nav.append(pageLink("\\u2190 Prev", {page: data.page - 1}));
+            nav.append(el("span", {}, `Page ${data.page} of ${data.total_pages}`));
+            if (data.next_cursor) nav.append(pageLink("Next \\u2192", {page: data.page + 1, ...data.next_cursor}));
+            root.append(nav);
+        }
+    }
+
+    window.addEventListener("popstate", loadPage);
+    loadPage();
+</script>
 """
 
 @app.route("/")
@@ -240,50 +373,161 @@ def dashboard():
     return render_template_string(LAYOUT, content=content, page="dashboard")
 
 
+def cache_thumbnail(drive_id):
+    """Download a Drive file into the local thumbnail cache and return its path.
+
+    Concurrent calls for the same file wait on the first one's download instead of starting their own.
+    """
+    cache_path = THUMBNAIL_CACHE_DIR / drive_id
+    if cache_path.exists():
+        return cache_path
+
+    with _THUMBNAIL_DOWNLOADS_LOCK:
+        download = _THUMBNAIL_DOWNLOADS.get(drive_id)
+        owner = download is None
+        if owner:
+            download = _THUMBNAIL_DOWNLOADS[drive_id] = Future()
+    if not owner:
+        return download.result()
+
+    try:
+        # The previous download may have finished between the exists() check and taking the lock
+        if not cache_path.exists():
+            download_thumbnail(drive_id, cache_path)
+        download.set_result(cache_path)
+    except Exception as e:
+        download.set_exception(e)
+        raise
+    finally:
+        with _THUMBNAIL_DOWNLOADS_LOCK:
+            _THUMBNAIL_DOWNLOADS.pop(drive_id, None)
+    return cache_path
+
+
+def download_thumbnail(drive_id, cache_path):
+    media_request = get_drive_service().files().get_media(fileId=drive_id)
+    fh = io.BytesIO()
+    downloader = MediaIoBaseDownload(fh, media_request)
+    done = False
+    while not done:
+        status, done = downloader.next_chunk()
+
+    tmp_path = THUMBNAIL_CACHE_DIR / f"{drive_id}.{threading.get_ident()}.part"
+    tmp_path.write_bytes(fh.getvalue())
+    os.replace(tmp_path, cache_path)
+
+
+def prefetch_thumbnail(drive_id):
+    try:
+        cache_thumbnail(drive_id)
+        return True
+    except Exception as e:
+        print(f"Error prefetching thumbnail {drive_id}: {e}")
+        return False
+
+
 @app.route("/thumbnail/<drive_id>")
 def thumbnail(drive_id):
     """Serve image thumbnails from Google Drive"""
+    # Drive IDs are content-addressable, so the browser copy is always valid
+    etag = f'"{drive_id}"'
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status=304, headers={"ETag": etag})
+    if not DRIVE_ID_RE.match(drive_id):
+        return Response(b'', status=404)
+
     try:
-        # Get file metadata to check mime type
-        file_meta = drive_service.files().get(fileId=drive_id, fields='mimeType').execute()
-        mime_type = file_meta.get('mimeType', 'image/jpeg')
-        
-        # Download the file
-        request = drive_service.files().get_media(fileId=drive_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-        
-        fh.seek(0)
-        return Response(fh.read(), mimetype=mime_type)
+        cache_path = cache_thumbnail(drive_id)
+
+        conn = get_db()
+        row = conn.execute("SELECT mime_type FROM media WHERE drive_id = ?", (drive_id,)).fetchone()
+        conn.close()
+        mime_type = row["mime_type"] if row and row["mime_type"] else "image/jpeg"
+
+        resp = send_file(cache_path, mimetype=mime_type)
+        resp.headers["Cache-Control"] = THUMBNAIL_CACHE_CONTROL
+        resp.headers["ETag"] = etag
+        return resp
     except Exception as e:
         print(f"Error fetching thumbnail: {e}")
         return Response(b'', status=404)
 
 
+@app.route("/api/prefetch", methods=["POST"])
+def api_prefetch():
+    """Queue a page of cards for the thumbnail cache and return without waiting for the downloads."""
+    data = request.get_json(silent=True) or {}
+    drive_ids = [d for d in data.get("drive_ids", []) if isinstance(d, str) and DRIVE_ID_RE.match(d)]
+    for drive_id in drive_ids:
+        PREFETCH_EXECUTOR.submit(prefetch_thumbnail, drive_id)
+    return ojson({"success": True, "queued": len(drive_ids)}, status=202)
+
+
+@lru_cache(maxsize=1)
+def gallery_shell():
+    """Render the list-page shell once; the data comes from /api/items."""
+    return render_template_string(LAYOUT, content=GALLERY_SHELL_CONTENT, page=None)
+
+
 @app.route("/pending")
 def pending():
-    return media_list("pending", "Pending Review")
+    return gallery_shell()
 
 @app.route("/approved")
 def approved():
-    return media_list("approved", "Approved Items")
+    return gallery_shell()
 
 @app.route("/rejected")
 def rejected():
-    return media_list("rejected", "Rejected Items")
+    return gallery_shell()
+
 
-def media_list(status, title):
+def fetch_media_page(status, page, before=None, before_id=None):
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM media WHERE status = ? ORDER BY created_at DESC", (status,))
+    cursor.execute("SELECT COUNT(*) FROM media WHERE status = ?", (status,))
+    total = cursor.fetchone()[0]
+
+    # before is '' for rows with neither date, which is still a valid cursor
+    if before is not None and before_id is not None:
+        # Keyset cursor from the "Next" link avoids OFFSET's linear skip on deep pages
+        cursor.execute(
+            "SELECT * FROM media WHERE status = ? AND (order_date, id) < (?, ?) "
+            "ORDER BY order_date DESC, id DESC LIMIT ?",
+            (status, before, before_id, PAGE_SIZE),
+        )
+    else:
+        cursor.execute(
+            "SELECT * FROM media WHERE status = ? ORDER BY order_date DESC, id DESC LIMIT ? OFFSET ?",
+            (status, PAGE_SIZE, (page - 1) * PAGE_SIZE),
+        )
     items = cursor.fetchall()
     conn.close()
-    
-    content = render_template_string(MEDIA_LIST_CONTENT, items=items, title=title, status=status)
-    return render_template_string(LAYOUT, content=content, page=status)
+    return items, total
+
+
+@app.route("/api/items")
+def api_items():
+    status = request.args.get("status", "pending")
+    page = max(1, request.args.get("page", 1, type=int))
+    items, total = fetch_media_page(
+        status, page,
+        before=request.args.get("before"),
+        before_id=request.args.get("before_id", type=int),
+    )
+
+    total_pages = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
+    next_cursor = None
+    if items and page < total_pages:
+        next_cursor = {"before": items[-1]["order_date"], "before_id": items[-1]["id"]}
+
+    return ojson({
+        "items": [dict(row) for row in items],
+        "total": total,
+        "page": page,
+        "total_pages": total_pages,
+        "next_cursor": next_cursor,
+    })
 
 
 @app.route("/scan", methods=["POST"])
@@ -329,7 +573,7 @@ def api_stats():
         stats[row[0]] = row[1]
     
     conn.close()
-    return jsonify(stats)
+    return ojson(stats)
 
 
 if __name__ == "__main__":
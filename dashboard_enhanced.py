@@ -21,7 +21,7 @@ from flask import (
     Flask, render_template_string, request, jsonify,
     redirect, url_for, send_file, abort
 )
-from sqlalchemy import func, and_, or_, desc, asc
+from sqlalchemy import func, and_, or_, desc, asc, insert, update
 from sqlalchemy.orm import Session
 
 # Add parent directory to path for imports
@@ -1855,24 +1855,32 @@ def api_bulk_approve():
         if not drive_ids:
             return jsonify({'success': False, 'error': 'No items specified'}), 400
 
-        approved_count = 0
-        for drive_id in drive_ids:
-            item = session.query(Asset).filter_by(drive_file_id=drive_id).first()
-            if item and item.status == 'needs_review':
-                item.status = 'approved'
-                item.approved_at = datetime.utcnow()
-                item.approved_by = 'dashboard_user'
-
-                review = Review(
-                    asset_id=item.asset_id,
-                    action='approve',
-                    reviewer='dashboard_user',
-                    changes={'status': 'approved', 'bulk': True}
-                )
-                session.add(review)
-                approved_count += 1
-
+        asset_ids = [row.asset_id for row in session.query(Asset.asset_id).filter(
+            Asset.drive_file_id.in_(drive_ids),
+            Asset.status == 'needs_review',
+        )]
+
+        # One timestamp for the whole batch keeps audit ordering stable
+        now = datetime.utcnow()
+        reviews = [{
+            'asset_id': asset_id,
+            'action': 'approve',
+            'reviewer': 'dashboard_user',
+            'changes': {'status': 'approved', 'bulk': True},
+            'created_at': now,
+        } for asset_id in asset_ids]
+
+        # One UPDATE and one executemany INSERT instead of per-object flushes
+        if asset_ids:
+            session.execute(
+                update(Asset)
+                .where(Asset.asset_id.in_(asset_ids))
+                .values(status='approved', approved_at=now, approved_by='dashboard_user'),
+                execution_options={'synchronize_session': False},
+            )
+            session.execute(insert(Review), reviews)
         session.commit()
+        approved_count = len(reviews)
 
         return jsonify({
             'success': True,
@@ -1900,23 +1908,30 @@ def api_bulk_reject():
         if not drive_ids:
             return jsonify({'success': False, 'error': 'No items specified'}), 400
 
-        rejected_count = 0
-        for drive_id in drive_ids:
-            item = session.query(Asset).filter_by(drive_file_id=drive_id).first()
-            if item and item.status == 'needs_review':
-                item.status = 'error'
-                item.approved_at = datetime.utcnow()
-
-                review = Review(
-                    asset_id=item.asset_id,
-                    action='reject',
-                    reviewer='dashboard_user',
-                    changes={'status': 'error', 'bulk': True}
-                )
-                session.add(review)
-                rejected_count += 1
-
+        asset_ids = [row.asset_id for row in session.query(Asset.asset_id).filter(
+            Asset.drive_file_id.in_(drive_ids),
+            Asset.status == 'needs_review',
+        )]
+
+        now = datetime.utcnow()
+        reviews = [{
+            'asset_id': asset_id,
+            'action': 'reject',
+            'reviewer': 'dashboard_user',
+            'changes': {'status': 'error', 'bulk': True},
+            'created_at': now,
+        } for asset_id in asset_ids]
+
+        if asset_ids:
+            session.execute(
+                update(Asset)
+                .where(Asset.asset_id.in_(asset_ids))
+                .values(status='error', approved_at=now),
+                execution_options={'synchronize_session': False},
+            )
+            session.execute(insert(Review), reviews)
         session.commit()
+        rejected_count = len(reviews)
 
         return jsonify({
             'success': True,
@@ -3,12 +3,18 @@ Family Archive Vault v11 - Video Player Integration
 Now extended with the core v8 dashboard, sharing, and duplicates routes.
 """
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import atexit
+import bisect
+import functools
 import hashlib
 import io
+import itertools
 import json
 import math
 import os
+import queue
+import re
 import secrets
 import sqlite3
 from pathlib import Path
@@ -16,17 +22,28 @@ from pathlib import Path
 from flask import (
     Flask,
     abort,
+    g,
+    has_request_context,
     jsonify,
     render_template,
+    Response,
     request,
     send_file,
     session,
+    stream_with_context,
 )
 
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+
 try:
     from flask_cors import CORS
 except Exception:
     CORS = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from services.api_ops import register_ops_routes
 
 # --- CONFIGURATION ---
@@ -36,8 +53,33 @@ DB_PATH = r"F:\FamilyArchive\data\archive.db"
 SERVICE_ACCOUNT_FILE = r"F:\FamilyArchive\config\service-account.json"
 SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
 ITEMS_PER_PAGE = 12
+SHARE_ITEMS_PER_PAGE = 48
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v")
+DRIVE_CHUNK_SIZE = 1024 * 1024
+THUMB_CACHE_DIR = Path(BASE_DIR) / "cache" / "thumbs"
+THUMB_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+# Drive IDs are URL-safe base64; anything else must not reach a cache path
+DRIVE_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+DB_POOL_SIZE = 8
+DB_STATEMENT_CACHE_SIZE = 256
+DB_OPTIMIZE_EVERY = 500
+# Default SQLITE_MAX_VARIABLE_NUMBER on builds older than 3.32
+SQLITE_MAX_VARIABLES = 999
+
+# orjson encodes natively; Flask's default() still covers Decimal, UUID and dataclasses
+class ORJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+json_loads = orjson.loads if orjson is not None else json.loads
 
 app = Flask(__name__, template_folder=TEMPLATE_DIR)
+if orjson is not None:
+    app.json = ORJSONProvider(app)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "family-archive-v11")
 
 
@@ -56,28 +98,125 @@ if CORS is not None:
     )
 
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+# Idle connections are reused LIFO so the hottest handle (and its page cache) goes out first
+_db_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+_db_release_count = itertools.count(1)
+
+
+# Applied once when a pooled connection is opened; WAL lets readers run alongside bulk_action writes
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=536870912",
+    "PRAGMA cache_size=-40000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA journal_size_limit=67108864",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def _apply_pragmas(conn):
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
+
+
+def _open_db_connection():
+    conn = sqlite3.connect(
+        DB_PATH, check_same_thread=False, cached_statements=DB_STATEMENT_CACHE_SIZE
+    )
     conn.row_factory = sqlite3.Row
+    _apply_pragmas(conn)
     return conn
 
 
+def _lease_db_connection():
+    try:
+        return _db_pool.get_nowait()
+    except queue.Empty:
+        return _open_db_connection()
+
+
+def get_db_connection():
+    # Helpers called within one request share a single leased connection
+    if has_request_context():
+        if "db" not in g:
+            g.db = _lease_db_connection()
+        return g.db
+    return _lease_db_connection()
+
+
+def _optimize_db(conn):
+    try:
+        conn.execute("PRAGMA optimize")
+    except sqlite3.Error:
+        pass
+
+
+def _return_db_connection(conn):
+    if conn.in_transaction:
+        conn.rollback()
+    # Keep planner statistics fresh as media and share_links grow
+    if next(_db_release_count) % DB_OPTIMIZE_EVERY == 0:
+        _optimize_db(conn)
+    try:
+        _db_pool.put_nowait(conn)
+    except queue.Full:
+        _optimize_db(conn)
+        conn.close()
+
+
+def release_db_connection(conn):
+    if has_request_context() and g.get("db") is conn:
+        # Returned to the pool at teardown; just leave no transaction open for the next helper
+        if conn.in_transaction:
+            conn.rollback()
+        return
+    _return_db_connection(conn)
+
+
+@app.teardown_request
+def release_request_db(exc=None):
+    conn = g.pop("db", None)
+    if conn is not None:
+        _return_db_connection(conn)
+
+
+@atexit.register
+def close_db_pool():
+    while True:
+        try:
+            conn = _db_pool.get_nowait()
+        except queue.Empty:
+            break
+        _optimize_db(conn)
+        conn.close()
+
+
 register_ops_routes(app, Path(DB_PATH))
 
 
-def table_exists(conn, table_name):
-    row = conn.execute(
-        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
-        (table_name,),
-    ).fetchone()
-    return row is not None
+# table name -> frozenset of column names; cleared whenever this module runs DDL
+_schema_cache = {}
+
+
+def invalidate_schema_cache():
+    _schema_cache.clear()
 
 
 def get_table_columns(conn, table_name):
-    if not table_exists(conn, table_name):
-        return set()
-    rows = conn.execute(f"PRAGMA table_info({table_name})").fetchall()
-    return {r["name"] for r in rows}
+    cols = _schema_cache.get(table_name)
+    if cols is None:
+        # table_xinfo also lists generated columns such as media.is_video
+        rows = conn.execute(f"PRAGMA table_xinfo({table_name})").fetchall()
+        cols = frozenset(r["name"] for r in rows)
+        # Missing tables are not cached: the workers may create them while we run
+        if cols:
+            _schema_cache[table_name] = cols
+    return cols
+
+
+def table_exists(conn, table_name):
+    return bool(get_table_columns(conn, table_name))
 
 
 def column_exists(conn, table_name, column_name):
@@ -97,11 +236,42 @@ def ensure_uploaded_dates(conn):
         WHERE uploaded_date IS NULL
         """
     )
+    # Rows the workers insert after startup get the same default on insert
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_media_uploaded_date
+        AFTER INSERT ON media
+        WHEN NEW.uploaded_date IS NULL
+        BEGIN
+            UPDATE media
+            SET uploaded_date = COALESCE(
+                substr(NEW.uploaded_at, 1, 10),
+                substr(NEW.created_at, 1, 10)
+            )
+            WHERE id = NEW.id;
+        END
+        """
+    )
     conn.commit()
 
 
-def paginate_items(items, page=1):
-    total_items = len(items)
+def get_ranked_media(conn, status, drive_ids):
+    # Join against the ranking as a VALUES table so rows come back in similarity order
+    values_sql = ",".join("(?,?)" for _ in drive_ids)
+    params = [x for i, d in enumerate(drive_ids) for x in (d, i)] + [status]
+    sql = (
+        f"WITH ranked(drive_id, rnk) AS (VALUES {values_sql}) "
+        "SELECT m.* FROM media m JOIN ranked r USING (drive_id) "
+        "WHERE m.status = ? ORDER BY r.rnk"
+    )
+    return conn.execute(sql, params).fetchall()
+
+
+def paginate_items(items, page=1, total_items=None):
+    # With total_items given, items is already the requested page from SQL
+    presliced = total_items is not None
+    if not presliced:
+        total_items = len(items)
     if total_items == 0:
         return {
             "items": [],
@@ -113,10 +283,11 @@ def paginate_items(items, page=1):
         }
     total_pages = math.ceil(total_items / ITEMS_PER_PAGE)
     page = max(1, min(page, total_pages))
-    start_idx = (page - 1) * ITEMS_PER_PAGE
-    end_idx = start_idx + ITEMS_PER_PAGE
+    if not presliced:
+        start_idx = (page - 1) * ITEMS_PER_PAGE
+        items = items[start_idx:start_idx + ITEMS_PER_PAGE]
     return {
-        "items": items[start_idx:end_idx],
+        "items": items,
         "current_page": page,
         "total_pages": total_pages,
         "total_items": total_items,
@@ -125,50 +296,88 @@ def paginate_items(items, page=1):
     }
 
 
-def get_gallery_items(status, search_query, sort_by):
+GALLERY_ORDER_BY = {
+    "newest": "uploaded_date DESC",
+    "oldest": "uploaded_date ASC",
+    "date_taken_newest": "COALESCE(date_taken, uploaded_date) DESC",
+    "date_taken_oldest": "COALESCE(date_taken, uploaded_date) ASC",
+    "filename_asc": "filename ASC",
+    "filename_desc": "filename DESC",
+}
+GALLERY_SEARCH_WHERE = "status = ? AND (filename LIKE ? OR ai_caption LIKE ?)"
+
+# Every (search, sort) combination maps to one fixed SQL string, so each pooled
+# connection's statement cache reuses the compiled VDBE program across requests.
+GALLERY_COUNT_SQL = {
+    searching: f"SELECT COUNT(*) FROM media WHERE {GALLERY_SEARCH_WHERE if searching else 'status = ?'}"
+    for searching in (False, True)
+}
+GALLERY_PAGE_SQL = {
+    (searching, sort_by): (
+        f"SELECT * FROM media WHERE {GALLERY_SEARCH_WHERE if searching else 'status = ?'} "
+        f"ORDER BY {order_by} LIMIT ? OFFSET ?"
+    )
+    for searching in (False, True)
+    for sort_by, order_by in GALLERY_ORDER_BY.items()
+}
+
+
+def get_gallery_items(status, search_query, sort_by, page=1, per_page=ITEMS_PER_PAGE):
     conn = get_db_connection()
-    ensure_uploaded_dates(conn)
 
-    query = "SELECT * FROM media WHERE status = ?"
+    searching = bool(search_query)
     params = [status]
-
-    if search_query:
-        query += " AND (filename LIKE ? OR ai_caption LIKE ?)"
+    if searching:
         like = f"%{search_query}%"
         params.extend([like, like])
+    if sort_by not in GALLERY_ORDER_BY:
+        sort_by = "newest"
 
-    if sort_by == "oldest":
-        query += " ORDER BY uploaded_date ASC"
-    elif sort_by == "date_taken_newest":
-        query += " ORDER BY COALESCE(date_taken, uploaded_date) DESC"
-    elif sort_by == "date_taken_oldest":
-        query += " ORDER BY COALESCE(date_taken, uploaded_date) ASC"
-    elif sort_by == "filename_asc":
-        query += " ORDER BY filename ASC"
-    elif sort_by == "filename_desc":
-        query += " ORDER BY filename DESC"
-    else:
-        query += " ORDER BY uploaded_date DESC"
+    total_items = conn.execute(GALLERY_COUNT_SQL[searching], params).fetchone()[0]
+    total_pages = max(1, math.ceil(total_items / per_page))
+    page = max(1, min(page, total_pages))
 
-    items = conn.execute(query, params).fetchall()
-    conn.close()
-    return items
+    params.extend([per_page, (page - 1) * per_page])
+    items = conn.execute(GALLERY_PAGE_SQL[(searching, sort_by)], params).fetchall()
+    release_db_connection(conn)
+    return items, total_items
+
+
+@functools.lru_cache(maxsize=1)
+def _drive_credentials():
+    from google.oauth2 import service_account
+
+    return service_account.Credentials.from_service_account_file(
+        SERVICE_ACCOUNT_FILE, scopes=SCOPES
+    )
+
+
+# Drive clients are reused like DB connections; httplib2 is not thread-safe, so each is leased to one request
+_drive_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
 
 
 def get_drive_service():
     try:
-        from google.oauth2 import service_account
+        return _drive_pool.get_nowait()
+    except queue.Empty:
+        pass
+
+    try:
         from googleapiclient.discovery import build
+        creds = _drive_credentials()
     except Exception:
         return None
+    return build("drive", "v3", credentials=creds, cache_discovery=False)
 
-    creds = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=SCOPES
-    )
-    return build("drive", "v3", credentials=creds)
 
+def release_drive_service(service):
+    try:
+        _drive_pool.put_nowait(service)
+    except queue.Full:
+        pass
 
-def drive_get_media_stream(drive_id):
+
+def drive_iter_media(drive_id, chunk_size=DRIVE_CHUNK_SIZE):
     service = get_drive_service()
     if not service:
         return None
@@ -176,16 +385,97 @@ def drive_get_media_stream(drive_id):
     try:
         from googleapiclient.http import MediaIoBaseDownload
     except Exception:
+        release_drive_service(service)
         return None
 
-    request_obj = service.files().get_media(fileId=drive_id)
-    file_stream = io.BytesIO()
-    downloader = MediaIoBaseDownload(file_stream, request_obj)
-    done = False
-    while done is False:
-        _, done = downloader.next_chunk()
-    file_stream.seek(0)
-    return file_stream
+    try:
+        request_obj = service.files().get_media(fileId=drive_id)
+        buffer = io.BytesIO()
+        downloader = MediaIoBaseDownload(buffer, request_obj, chunksize=chunk_size)
+    except Exception:
+        # The generator's finally never runs if we fail before creating it
+        release_drive_service(service)
+        return None
+
+    def generate():
+        # Hand each Drive chunk to the client and reuse the buffer, so memory stays O(chunk)
+        try:
+            done = False
+            while done is False:
+                _, done = downloader.next_chunk()
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        finally:
+            release_drive_service(service)
+
+    return generate()
+
+
+def _tee_to_cache(chunks, cache_path):
+    # Write through to a temp file and only publish it once the download completes
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{secrets.token_hex(4)}.part")
+    complete = False
+    try:
+        with open(tmp_path, "wb") as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+                yield chunk
+        os.replace(tmp_path, cache_path)
+        complete = True
+    finally:
+        if not complete:
+            tmp_path.unlink(missing_ok=True)
+
+
+def drive_media_response(drive_id, mimetype, headers=None, cache_path=None):
+    chunks = drive_iter_media(drive_id)
+    if chunks is None:
+        abort(404)
+    # Pull the first chunk before answering so a missing file is a 404, not a broken stream
+    try:
+        first = next(chunks)
+    except StopIteration:
+        first = b""
+    except Exception:
+        abort(404)
+    stream = itertools.chain([first], chunks)
+    if cache_path is not None:
+        stream = _tee_to_cache(stream, cache_path)
+    return Response(stream_with_context(stream), mimetype=mimetype, headers=headers)
+
+
+def parse_range_header(range_header, size):
+    """Return the inclusive (start, end) of a single "bytes=" range, or None to send the whole file.
+
+    Missing, malformed and multi-range headers are ignored, as RFC 9110 allows;
+    a well-formed range that starts past the end of the file raises a 416.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+    start_s, sep, end_s = spec.partition("-")
+    if not sep or not (start_s or end_s):
+        return None
+    try:
+        first = int(start_s) if start_s else None
+        last = int(end_s) if end_s else None
+    except ValueError:
+        return None
+    if (first is not None and first < 0) or (last is not None and last < 0):
+        return None
+    if first is None:
+        # Suffix range: the final `last` bytes
+        if last == 0 or size == 0:
+            raise RequestedRangeNotSatisfiable(length=size)
+        return max(size - last, 0), size - 1
+    if last is not None and last < first:
+        return None
+    if first >= size:
+        raise RequestedRangeNotSatisfiable(length=size)
+    return first, size - 1 if last is None else min(last, size - 1)
 
 
 def ensure_share_links_schema(conn):
@@ -198,6 +488,8 @@ def ensure_share_links_schema(conn):
         alters.append("ALTER TABLE share_links ADD COLUMN password_hash TEXT")
     if "password_salt" not in cols:
         alters.append("ALTER TABLE share_links ADD COLUMN password_salt TEXT")
+    if "password_algo" not in cols:
+        alters.append("ALTER TABLE share_links ADD COLUMN password_algo TEXT")
     if "max_views" not in cols:
         alters.append("ALTER TABLE share_links ADD COLUMN max_views INTEGER")
     if "allow_download" not in cols:
@@ -212,20 +504,218 @@ def ensure_share_links_schema(conn):
             pass
     if alters:
         conn.commit()
+        invalidate_schema_cache()
+
+
+# (name, table, indexed columns/expressions, columns that must exist first)
+SCHEMA_INDEXES = (
+    ("ix_media_status_uploaded", "media", "status, uploaded_date DESC", ("status", "uploaded_date")),
+    ("ix_media_uploaded", "media", "uploaded_date DESC", ("uploaded_date",)),
+    ("ix_media_status_filename", "media", "status, filename", ("status", "filename")),
+    (
+        "ix_media_status_datetaken",
+        "media",
+        "status, COALESCE(date_taken, uploaded_date) DESC",
+        ("status", "date_taken", "uploaded_date"),
+    ),
+    (
+        # Covers every /api/recent column so the top 10 come straight off the index
+        "ix_media_recent_cover",
+        "media",
+        "COALESCE(uploaded_date, substr(created_at, 1, 10)) DESC, drive_id, filename, "
+        "original_filename, mime_type, status, uploaded_date, date_taken, created_at, ai_caption",
+        (
+            "drive_id", "filename", "original_filename", "mime_type", "status",
+            "uploaded_date", "date_taken", "created_at", "ai_caption",
+        ),
+    ),
+    ("ix_faces_cluster_drive", "faces", "cluster_id, drive_id", ("cluster_id", "drive_id")),
+    ("ix_share_links_active_created", "share_links", "is_active, created_date DESC", ("is_active", "created_date")),
+    ("ix_share_links_token", "share_links", "token", ("token",)),
+    ("ix_transcripts_mediaid", "transcripts", "media_id", ("media_id",)),
+    ("ix_metadata_key_media", "metadata", "key, media_id", ("key", "media_id")),
+)
 
 
-def hash_password(password, salt=None):
-    if salt is None:
-        salt = secrets.token_hex(16)
-    digest = hashlib.pbkdf2_hmac(
+def ensure_is_video_column(conn):
+    if "is_video" in get_table_columns(conn, "media"):
+        return
+    exts = " OR ".join(f"lower(filename) GLOB '*{ext}'" for ext in VIDEO_EXTENSIONS)
+    try:
+        conn.execute(
+            "ALTER TABLE media ADD COLUMN is_video INTEGER GENERATED ALWAYS AS "
+            f"(CASE WHEN mime_type LIKE 'video/%' OR {exts} THEN 1 ELSE 0 END) VIRTUAL"
+        )
+    except sqlite3.OperationalError:
+        # SQLite older than 3.31 has no generated columns; keep the LIKE fallback
+        return
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_media_is_video ON media(is_video) WHERE is_video = 1")
+    conn.commit()
+    invalidate_schema_cache()
+
+
+def ensure_transcripts_fts(conn):
+    cols = get_table_columns(conn, "transcripts")
+    if "full_text" not in cols or table_exists(conn, "transcripts_fts"):
+        return
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE transcripts_fts USING fts5("
+            "full_text, content='transcripts', content_rowid='rowid')"
+        )
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5; search_transcripts keeps the LIKE scan
+        return
+    # External-content index, kept in step with whatever the whisper worker writes
+    conn.executescript(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_transcripts_fts_insert AFTER INSERT ON transcripts BEGIN
+            INSERT INTO transcripts_fts(rowid, full_text) VALUES (NEW.rowid, NEW.full_text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_transcripts_fts_delete AFTER DELETE ON transcripts BEGIN
+            INSERT INTO transcripts_fts(transcripts_fts, rowid, full_text)
+            VALUES ('delete', OLD.rowid, OLD.full_text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_transcripts_fts_update AFTER UPDATE OF full_text ON transcripts BEGIN
+            INSERT INTO transcripts_fts(transcripts_fts, rowid, full_text)
+            VALUES ('delete', OLD.rowid, OLD.full_text);
+            INSERT INTO transcripts_fts(rowid, full_text) VALUES (NEW.rowid, NEW.full_text);
+        END;
+        INSERT INTO transcripts_fts(transcripts_fts) VALUES ('rebuild');
+        """
+    )
+    conn.commit()
+    invalidate_schema_cache()
+
+
+CLUSTER_SUMMARY_ROW_SQL = """
+    SELECT c.id, c.name,
+           (SELECT drive_id FROM faces WHERE id = c.representative_face_id),
+           (SELECT COUNT(*) FROM faces WHERE cluster_id = c.id)
+    FROM clusters c
+"""
+
+
+def ensure_cluster_summary(conn):
+    if not (table_exists(conn, "clusters") and table_exists(conn, "faces")):
+        return
+    if table_exists(conn, "cluster_summary"):
+        return
+    # people_view reads this instead of self-joining faces; triggers keep it current
+    conn.executescript(
+        f"""
+        CREATE TABLE cluster_summary (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            rep_drive_id TEXT,
+            face_count INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT INTO cluster_summary (id, name, rep_drive_id, face_count) {CLUSTER_SUMMARY_ROW_SQL};
+
+        CREATE TRIGGER IF NOT EXISTS trg_cluster_summary_cluster_insert AFTER INSERT ON clusters BEGIN
+            INSERT OR REPLACE INTO cluster_summary (id, name, rep_drive_id, face_count)
+            {CLUSTER_SUMMARY_ROW_SQL} WHERE c.id = NEW.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_cluster_summary_cluster_update AFTER UPDATE ON clusters BEGIN
+            DELETE FROM cluster_summary WHERE id = OLD.id;
+            INSERT OR REPLACE INTO cluster_summary (id, name, rep_drive_id, face_count)
+            {CLUSTER_SUMMARY_ROW_SQL} WHERE c.id = NEW.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_cluster_summary_cluster_delete AFTER DELETE ON clusters BEGIN
+            DELETE FROM cluster_summary WHERE id = OLD.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_cluster_summary_face_insert AFTER INSERT ON faces
+        WHEN NEW.cluster_id IS NOT NULL BEGIN
+            UPDATE cluster_summary SET face_count = face_count + 1 WHERE id = NEW.cluster_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_cluster_summary_face_delete AFTER DELETE ON faces
+        WHEN OLD.cluster_id IS NOT NULL BEGIN
+            UPDATE cluster_summary SET face_count = face_count - 1 WHERE id = OLD.cluster_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_cluster_summary_face_move AFTER UPDATE OF cluster_id ON faces
+        WHEN OLD.cluster_id IS NOT NEW.cluster_id BEGIN
+            UPDATE cluster_summary SET face_count = face_count - 1 WHERE id = OLD.cluster_id;
+            UPDATE cluster_summary SET face_count = face_count + 1 WHERE id = NEW.cluster_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_cluster_summary_face_drive AFTER UPDATE OF drive_id ON faces BEGIN
+            UPDATE cluster_summary SET rep_drive_id = NEW.drive_id
+            WHERE id IN (SELECT id FROM clusters WHERE representative_face_id = NEW.id);
+        END;
+        """
+    )
+    conn.commit()
+    invalidate_schema_cache()
+
+
+def init_schema(conn):
+    # Migrations run once at startup rather than at the top of every handler
+    ensure_uploaded_dates(conn)
+    ensure_share_links_schema(conn)
+    ensure_is_video_column(conn)
+    ensure_transcripts_fts(conn)
+    ensure_cluster_summary(conn)
+
+    # Tables come from several workers, so only index what this archive actually has
+    for name, table, columns, required in SCHEMA_INDEXES:
+        cols = get_table_columns(conn, table)
+        if cols and all(c in cols for c in required):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})")
+    if "drive_id" in get_table_columns(conn, "media"):
+        try:
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_media_driveid ON media(drive_id)")
+        except sqlite3.IntegrityError:
+            # Legacy archives may hold duplicate drive_ids; fall back to the existing lookup index
+            pass
+    conn.commit()
+
+
+_boot_conn = get_db_connection()
+init_schema(_boot_conn)
+if os.environ.get("FLASK_OPTIMIZE_ON_BOOT"):
+    # Full analysis up front so the first requests already get good plans;
+    # analysis_limit samples each index, keeping this cheap on a large archive
+    _boot_conn.execute("PRAGMA analysis_limit=400")
+    try:
+        _boot_conn.execute("PRAGMA optimize=0x10002")
+    finally:
+        # The connection goes back to the pool; leave its release-time optimize unlimited
+        _boot_conn.execute("PRAGMA analysis_limit=0")
+release_db_connection(_boot_conn)
+
+
+# Memoised so reloading a password-protected share does not re-run the KDF
+@functools.lru_cache(maxsize=256)
+def _derive_pbkdf2_sha256(password, salt):
+    return hashlib.pbkdf2_hmac(
         "sha256", password.encode("utf-8"), salt.encode("utf-8"), 100_000
     ).hex()
-    return digest, salt
+
+
+@functools.lru_cache(maxsize=256)
+def _derive_scrypt(password, salt):
+    return hashlib.scrypt(
+        password.encode("utf-8"), salt=salt.encode("utf-8"), n=2**14, r=8, p=1
+    ).hex()
+
+
+PASSWORD_KDFS = {
+    "pbkdf2_sha256": _derive_pbkdf2_sha256,
+    "scrypt": _derive_scrypt,
+}
+DEFAULT_PASSWORD_ALGO = "scrypt"
+# Shares created before password_algo existed were all PBKDF2
+LEGACY_PASSWORD_ALGO = "pbkdf2_sha256"
+
+
+def hash_password(password, salt=None, algo=DEFAULT_PASSWORD_ALGO):
+    if salt is None:
+        salt = secrets.token_hex(16)
+    return PASSWORD_KDFS[algo](password, salt), salt
 
 
 def create_share_link(data):
     conn = get_db_connection()
-    ensure_share_links_schema(conn)
     cols = get_table_columns(conn, "share_links")
 
     token = secrets.token_urlsafe(32)
@@ -243,8 +733,18 @@ def create_share_link(data):
 
     password_hash = None
     password_salt = None
+    password_algo = None
     if password:
-        password_hash, password_salt = hash_password(password)
+        # Without a password_algo column the algorithm is dropped on insert and
+        # verify_share_link assumes the legacy KDF, so only use scrypt if it sticks
+        if "password_algo" not in cols:
+            ensure_share_links_schema(conn)
+            cols = get_table_columns(conn, "share_links")
+        if "password_algo" in cols:
+            password_algo = DEFAULT_PASSWORD_ALGO
+        else:
+            password_algo = LEGACY_PASSWORD_ALGO
+        password_hash, password_salt = hash_password(password, algo=password_algo)
 
     values = {
         "token": token,
@@ -256,6 +756,7 @@ def create_share_link(data):
         "view_count": 0,
         "password_hash": password_hash,
         "password_salt": password_salt,
+        "password_algo": password_algo,
         "max_views": max_views,
         "allow_download": allow_download,
     }
@@ -265,13 +766,12 @@ def create_share_link(data):
     sql = f"INSERT INTO share_links ({', '.join(insert_cols)}) VALUES ({placeholders})"
     conn.execute(sql, [values[c] for c in insert_cols])
     conn.commit()
-    conn.close()
+    release_db_connection(conn)
     return token
 
 
 def get_all_share_links():
     conn = get_db_connection()
-    ensure_share_links_schema(conn)
     links = conn.execute(
         """
         SELECT * FROM share_links
@@ -279,7 +779,7 @@ def get_all_share_links():
         ORDER BY created_date DESC
         """
     ).fetchall()
-    conn.close()
+    release_db_connection(conn)
 
     result = []
     for link in links:
@@ -296,18 +796,17 @@ def revoke_share_link(token):
     conn = get_db_connection()
     conn.execute("UPDATE share_links SET is_active = 0 WHERE token = ?", (token,))
     conn.commit()
-    conn.close()
+    release_db_connection(conn)
 
 
-def verify_share_link(token, password=None):
+def verify_share_link(token, password=None, count_view=True):
     conn = get_db_connection()
-    ensure_share_links_schema(conn)
 
     link = conn.execute(
         "SELECT * FROM share_links WHERE token = ? AND is_active = 1", (token,)
     ).fetchone()
     if not link:
-        conn.close()
+        release_db_connection(conn)
         return None
 
     link_dict = dict(link)
@@ -316,7 +815,7 @@ def verify_share_link(token, password=None):
     if expires_date:
         try:
             if datetime.now() > datetime.fromisoformat(expires_date):
-                conn.close()
+                release_db_connection(conn)
                 return None
         except ValueError:
             pass
@@ -326,7 +825,7 @@ def verify_share_link(token, password=None):
     if max_views and view_count >= max_views:
         conn.execute("UPDATE share_links SET is_active = 0 WHERE token = ?", (token,))
         conn.commit()
-        conn.close()
+        release_db_connection(conn)
         return None
 
     needs_password = bool(link_dict.get("password_hash"))
@@ -334,23 +833,28 @@ def verify_share_link(token, password=None):
 
     if needs_password and token not in verified_tokens:
         if not password:
-            conn.close()
+            release_db_connection(conn)
             return {"requires_password": True, "link": link_dict}
         salt = link_dict.get("password_salt") or ""
         expected = link_dict.get("password_hash")
-        actual, _ = hash_password(password, salt=salt)
+        algo = link_dict.get("password_algo") or LEGACY_PASSWORD_ALGO
+        if algo not in PASSWORD_KDFS:
+            release_db_connection(conn)
+            return {"requires_password": True, "link": link_dict}
+        actual, _ = hash_password(password, salt=salt, algo=algo)
         if not secrets.compare_digest(actual, expected):
-            conn.close()
+            release_db_connection(conn)
             return {"requires_password": True, "link": link_dict}
         verified_tokens.add(token)
         session["verified_share_tokens"] = list(verified_tokens)
 
-    conn.execute(
-        "UPDATE share_links SET view_count = COALESCE(view_count, 0) + 1 WHERE token = ?",
-        (token,),
-    )
-    conn.commit()
-    conn.close()
+    if count_view:
+        conn.execute(
+            "UPDATE share_links SET view_count = COALESCE(view_count, 0) + 1 WHERE token = ?",
+            (token,),
+        )
+        conn.commit()
+    release_db_connection(conn)
     link_dict["requires_password"] = False
     return link_dict
 
@@ -361,7 +865,6 @@ def transcript_table_exists(conn):
 
 def get_video_info(drive_id):
     conn = get_db_connection()
-    ensure_uploaded_dates(conn)
 
     video = conn.execute(
         """
@@ -372,7 +875,7 @@ def get_video_info(drive_id):
         (drive_id,),
     ).fetchone()
     if not video:
-        conn.close()
+        release_db_connection(conn)
         return None
 
     transcript = None
@@ -389,12 +892,12 @@ def get_video_info(drive_id):
             try:
                 transcript = {
                     "full_text": transcript_row[0],
-                    "segments": json.loads(transcript_row[1]),
+                    "segments": json_loads(transcript_row[1]),
                 }
             except json.JSONDecodeError:
                 transcript = None
 
-    conn.close()
+    release_db_connection(conn)
     return {
         "drive_id": video[0],
         "filename": video[1],
@@ -408,21 +911,21 @@ def get_video_info(drive_id):
 @app.route("/")
 def dashboard():
     conn = get_db_connection()
-    ensure_uploaded_dates(conn)
-    stats = conn.execute(
-        """
-        SELECT
-            COUNT(*) as total,
-            SUM(case when status = 'pending' then 1 else 0 end) as pending,
-            SUM(case when status = 'approved' then 1 else 0 end) as approved,
-            SUM(case when status = 'rejected' then 1 else 0 end) as rejected
-        FROM media
-        """
-    ).fetchone()
+    # Grouped count walks the status-leading index instead of CASE-testing every row
+    rows = conn.execute(
+        "SELECT status, COUNT(*) AS c FROM media GROUP BY status"
+    ).fetchall()
+    counts = {r["status"]: r["c"] for r in rows}
+    stats = {
+        "total": sum(counts.values()),
+        "pending": counts.get("pending", 0),
+        "approved": counts.get("approved", 0),
+        "rejected": counts.get("rejected", 0),
+    }
     recent_items = conn.execute(
         "SELECT * FROM media ORDER BY uploaded_date DESC LIMIT 6"
     ).fetchall()
-    conn.close()
+    release_db_connection(conn)
     return render_template("dashboard_tailwind.html", stats=stats, recent_items=recent_items)
 
 
@@ -434,12 +937,25 @@ def _format_number(value):
         return "0"
 
 
+_ISO_DATETIME_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{2}):(\d{2}):(\d{2}))?$")
+
+
 def _parse_datetime(value):
     if not value:
         return None
     s = str(value).strip()
     if not s:
         return None
+    # Plain naive timestamps are the common case; build them without the generic parser
+    m = _ISO_DATETIME_RE.match(s)
+    if m:
+        try:
+            return datetime(
+                int(m[1]), int(m[2]), int(m[3]),
+                int(m[4] or 0), int(m[5] or 0), int(m[6] or 0),
+            )
+        except ValueError:
+            return None
     if s.endswith("Z"):
         s = s[:-1] + "+00:00"
     try:
@@ -451,14 +967,26 @@ def _parse_datetime(value):
             return None
 
 
-def _time_ago(value):
+_ISO_DATE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})")
+
+
+def _days_since(value, today):
+    # Day granularity only needs the date prefix, so skip building a datetime
+    m = _ISO_DATE_RE.match(str(value)) if value else None
+    if m:
+        try:
+            return today.toordinal() - date(int(m[1]), int(m[2]), int(m[3])).toordinal()
+        except ValueError:
+            return None
     dt = _parse_datetime(value)
-    if not dt:
-        return "Unknown"
+    return (today - dt.date()).days if dt else None
 
-    now = datetime.now(dt.tzinfo) if dt.tzinfo else datetime.now()
-    delta = now - dt
-    days = max(delta.days, 0)
+
+def _time_ago(value, today=None):
+    days = _days_since(value, today or date.today())
+    if days is None:
+        return "Unknown"
+    days = max(days, 0)
 
     if days == 0:
         return "today"
@@ -486,61 +1014,52 @@ def _seconds_to_mmss(seconds):
 
 
 def _is_video(row):
-    mime_type = (row["mime_type"] or "").lower() if "mime_type" in row.keys() else ""
-    filename = (row["filename"] or "").lower() if "filename" in row.keys() else ""
+    keys = row.keys()
+    if "is_video" in keys and row["is_video"] is not None:
+        return bool(row["is_video"])
+    mime_type = (row["mime_type"] or "").lower() if "mime_type" in keys else ""
+    filename = (row["filename"] or "").lower() if "filename" in keys else ""
     if mime_type.startswith("video/"):
         return True
-    video_exts = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v")
-    return filename.endswith(video_exts)
-
-
-def _video_filter_sql():
-    return (
-        "(mime_type LIKE 'video/%' "
-        "OR lower(filename) LIKE '%.mp4' "
-        "OR lower(filename) LIKE '%.mov' "
-        "OR lower(filename) LIKE '%.avi' "
-        "OR lower(filename) LIKE '%.mkv' "
-        "OR lower(filename) LIKE '%.webm' "
-        "OR lower(filename) LIKE '%.m4v')"
-    )
+    return filename.endswith(VIDEO_EXTENSIONS)
+
+
+def _video_filter_sql(conn):
+    if "is_video" in get_table_columns(conn, "media"):
+        return "m.is_video = 1"
+    likes = " ".join(f"OR lower(filename) LIKE '%{ext}'" for ext in VIDEO_EXTENSIONS)
+    return f"(mime_type LIKE 'video/%' {likes})"
+
+
+VIDEO_DURATION_KEYS = (
+    "duration_seconds",
+    "video_duration_seconds",
+    "duration",
+    "duration_sec",
+)
 
 
-def _get_faces_indexed(conn):
+def _faces_indexed_sql(conn):
     if not table_exists(conn, "faces"):
-        return 0
-    row = conn.execute("SELECT COUNT(*) AS count FROM faces").fetchone()
-    return row["count"] if row and "count" in row.keys() else 0
+        return "0", []
+    return "(SELECT COUNT(*) FROM faces)", []
 
 
-def _get_video_hours_seconds(conn):
+def _video_seconds_sql(conn):
     if not table_exists(conn, "metadata"):
-        return 0.0
+        return "0.0", []
 
-    duration_keys = (
-        "duration_seconds",
-        "video_duration_seconds",
-        "duration",
-        "duration_sec",
-    )
-    placeholders = ",".join(["?" for _ in duration_keys])
-    video_filter = _video_filter_sql()
-
-    sql = f"""
-        SELECT md.value
+    placeholders = ",".join(["?" for _ in VIDEO_DURATION_KEYS])
+    video_filter = _video_filter_sql(conn)
+    # Non-numeric values CAST to 0, matching the old skip-on-ValueError loop
+    sql = f"""(
+        SELECT COALESCE(SUM(CAST(md.value AS REAL)), 0.0)
         FROM metadata md
         JOIN media m ON m.id = md.media_id
         WHERE md.key IN ({placeholders})
           AND {video_filter}
-    """
-
-    total_seconds = 0.0
-    for row in conn.execute(sql, duration_keys).fetchall():
-        try:
-            total_seconds += float(row["value"])
-        except (TypeError, ValueError, KeyError):
-            continue
-    return total_seconds
+    )"""
+    return sql, list(VIDEO_DURATION_KEYS)
 
 
 def _format_hours(total_seconds):
@@ -554,12 +1073,22 @@ def _format_hours(total_seconds):
 @app.route("/api/stats")
 def api_stats_react():
     conn = get_db_connection()
-    ensure_uploaded_dates(conn)
 
-    total_files = conn.execute("SELECT COUNT(*) AS count FROM media").fetchone()["count"]
-    faces_indexed = _get_faces_indexed(conn)
-    video_seconds = _get_video_hours_seconds(conn)
-    conn.close()
+    faces_sql, faces_params = _faces_indexed_sql(conn)
+    video_sql, video_params = _video_seconds_sql(conn)
+    row = conn.execute(
+        f"""
+        SELECT
+            (SELECT COUNT(*) FROM media) AS total_files,
+            {faces_sql} AS faces_indexed,
+            {video_sql} AS video_seconds
+        """,
+        faces_params + video_params,
+    ).fetchone()
+    release_db_connection(conn)
+    total_files = row["total_files"]
+    faces_indexed = row["faces_indexed"]
+    video_seconds = row["video_seconds"]
 
     payload = [
         {
@@ -584,7 +1113,6 @@ def api_stats_react():
 @app.route("/api/recent")
 def api_recent_react():
     conn = get_db_connection()
-    ensure_uploaded_dates(conn)
 
     rows = conn.execute(
         """
@@ -595,10 +1123,11 @@ def api_recent_react():
         LIMIT 10
         """
     ).fetchall()
-    conn.close()
+    release_db_connection(conn)
 
     items = []
     api_base = request.host_url.rstrip("/")
+    today = date.today()
     for row in rows:
         date_source = row["uploaded_date"] or row["date_taken"] or row["created_at"]
         items.append(
@@ -606,7 +1135,7 @@ def api_recent_react():
                 "id": row["drive_id"],
                 "type": "video" if _is_video(row) else "photo",
                 "title": row["original_filename"] or row["filename"],
-                "date": _time_ago(date_source),
+                "date": _time_ago(date_source, today),
                 "thumbnail": f"{api_base}/thumbnail/{row['drive_id']}",
                 "drive_id": row["drive_id"],
                 "mime_type": row["mime_type"],
@@ -632,26 +1161,38 @@ def _get_transcript_columns(conn):
 def api_transcript(video_id):
     conn = get_db_connection()
     if not transcript_table_exists(conn):
-        conn.close()
+        release_db_connection(conn)
         return jsonify([])
 
     id_col, seg_col, text_col = _get_transcript_columns(conn)
     if not id_col:
-        conn.close()
+        release_db_connection(conn)
         return jsonify([])
 
     select_cols = [c for c in (seg_col, text_col) if c]
     sql = f"SELECT {', '.join(select_cols)} FROM transcripts WHERE {id_col} = ? LIMIT 1"
     row = conn.execute(sql, (video_id,)).fetchone()
-    conn.close()
+    release_db_connection(conn)
 
     if not row:
         return jsonify([])
 
+    body, etag = _render_transcript(
+        row[0] if seg_col else None, row[-1] if text_col else None
+    )
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    # Unchanged transcripts come back as an empty 304
+    return resp.make_conditional(request)
+
+
+# Keyed on the stored transcript itself, so an edited transcript renders afresh
+@functools.lru_cache(maxsize=512)
+def _render_transcript(segments_json, text_value):
     segments = []
-    if seg_col:
+    if segments_json:
         try:
-            raw_segments = json.loads(row[0]) if row[0] else []
+            raw_segments = json_loads(segments_json)
         except (json.JSONDecodeError, TypeError):
             raw_segments = []
 
@@ -659,21 +1200,23 @@ def api_transcript(video_id):
             start = seg.get("start") or seg.get("start_time") or 0
             segments.append({"time": _seconds_to_mmss(start), "text": seg.get("text") or ""})
 
-    if not segments and text_col:
-        text_value = row[-1] if select_cols else None
-        if text_value:
-            segments = [{"time": "00:00", "text": str(text_value)}]
+    if not segments and text_value:
+        segments = [{"time": "00:00", "text": str(text_value)}]
 
-    return jsonify(segments)
+    body = app.json.dumps(segments)
+    return body, hashlib.sha1(body.encode("utf-8")).hexdigest()
 
 
-def _format_expiry(expires_date):
+def _format_expiry(expires_date, now=None):
     if not expires_date:
         return "Never", True
     dt = _parse_datetime(expires_date)
     if not dt:
         return str(expires_date)[:10], True
-    now = datetime.now(dt.tzinfo) if dt.tzinfo else datetime.now()
+    if dt.tzinfo:
+        now = datetime.now(dt.tzinfo)
+    elif now is None:
+        now = datetime.now()
     is_active = now <= dt
     return ("Expired" if not is_active else dt.date().isoformat()), is_active
 
@@ -682,10 +1225,9 @@ def _format_expiry(expires_date):
 def api_shares_react():
     conn = get_db_connection()
     if not table_exists(conn, "share_links"):
-        conn.close()
+        release_db_connection(conn)
         return jsonify([])
 
-    ensure_share_links_schema(conn)
     rows = conn.execute(
         """
         SELECT * FROM share_links
@@ -693,12 +1235,13 @@ def api_shares_react():
         ORDER BY created_date DESC
         """
     ).fetchall()
-    conn.close()
+    release_db_connection(conn)
 
     shares = []
+    now = datetime.now()
     for row in rows:
         link = dict(row)
-        expires_label, not_expired = _format_expiry(link.get("expires_date"))
+        expires_label, not_expired = _format_expiry(link.get("expires_date"), now)
         view_count = int(link.get("view_count") or 0)
         max_views = link.get("max_views")
         limit = int(max_views) if max_views else 0
@@ -728,7 +1271,7 @@ def pending_review():
     sort_by = request.args.get("sort", "newest")
     search_mode = request.args.get("mode", "keyword")
 
-    items = []
+    items, total_items = [], None
     if search_mode == "semantic" and search_query:
         try:
             from semantic_search import semantic_search
@@ -739,18 +1282,12 @@ def pending_review():
             drive_ids = [r[0] for r in results]
             if drive_ids:
                 conn = get_db_connection()
-                placeholders = ",".join(["?" for _ in drive_ids])
-                sql = (
-                    "SELECT * FROM media WHERE status = 'pending' AND drive_id IN ("
-                    + placeholders
-                    + ")"
-                )
-                items = conn.execute(sql, drive_ids).fetchall()
-                conn.close()
+                items = get_ranked_media(conn, "pending", drive_ids)
+                release_db_connection(conn)
     if not items:
-        items = get_gallery_items("pending", search_query, sort_by)
+        items, total_items = get_gallery_items("pending", search_query, sort_by, page)
 
-    paginated = paginate_items(items, page)
+    paginated = paginate_items(items, page, total_items)
     return render_template(
         "gallery_tailwind.html",
         title="Pending Review",
@@ -770,7 +1307,7 @@ def approved_items():
     sort_by = request.args.get("sort", "newest")
     search_mode = request.args.get("mode", "keyword")
 
-    items = []
+    items, total_items = [], None
     if search_mode == "semantic" and search_query:
         try:
             from semantic_search import semantic_search
@@ -781,18 +1318,12 @@ def approved_items():
             drive_ids = [r[0] for r in results]
             if drive_ids:
                 conn = get_db_connection()
-                placeholders = ",".join(["?" for _ in drive_ids])
-                sql = (
-                    "SELECT * FROM media WHERE status = 'approved' AND drive_id IN ("
-                    + placeholders
-                    + ")"
-                )
-                items = conn.execute(sql, drive_ids).fetchall()
-                conn.close()
+                items = get_ranked_media(conn, "approved", drive_ids)
+                release_db_connection(conn)
     if not items:
-        items = get_gallery_items("approved", search_query, sort_by)
+        items, total_items = get_gallery_items("approved", search_query, sort_by, page)
 
-    paginated = paginate_items(items, page)
+    paginated = paginate_items(items, page, total_items)
     return render_template(
         "gallery_tailwind.html",
         title="Approved Archive",
@@ -824,20 +1355,22 @@ def duplicates_view():
 @app.route("/people")
 def people_view():
     conn = get_db_connection()
-    if not (table_exists(conn, "clusters") and table_exists(conn, "faces")):
-        conn.close()
+    if not table_exists(conn, "cluster_summary"):
+        # The face worker may have created its tables after startup
+        ensure_cluster_summary(conn)
+    if not table_exists(conn, "cluster_summary"):
+        release_db_connection(conn)
         return render_template("people.html", people=[])
 
     people = conn.execute(
         """
-        SELECT c.id, c.name, f.drive_id as rep_drive_id, COUNT(f2.id) as face_count
-        FROM clusters c
-        JOIN faces f ON c.representative_face_id = f.id
-        JOIN faces f2 ON c.id = f2.cluster_id
-        GROUP BY c.id
+        SELECT id, name, rep_drive_id, face_count
+        FROM cluster_summary
+        WHERE rep_drive_id IS NOT NULL AND face_count > 0
+        ORDER BY id
         """
     ).fetchall()
-    conn.close()
+    release_db_connection(conn)
     return render_template("people.html", people=people)
 
 
@@ -846,7 +1379,7 @@ def person_gallery(cluster_id):
     page = request.args.get("page", 1, type=int)
     conn = get_db_connection()
     if not (table_exists(conn, "clusters") and table_exists(conn, "faces")):
-        conn.close()
+        release_db_connection(conn)
         return render_template(
             "gallery_tailwind.html",
             title="Person",
@@ -860,6 +1393,17 @@ def person_gallery(cluster_id):
     person = conn.execute(
         "SELECT name FROM clusters WHERE id = ?", (cluster_id,)
     ).fetchone()
+    total_items = conn.execute(
+        """
+        SELECT COUNT(DISTINCT m.id)
+        FROM media m
+        JOIN faces f ON m.drive_id = f.drive_id
+        WHERE f.cluster_id = ?
+        """,
+        (cluster_id,),
+    ).fetchone()[0]
+    total_pages = max(1, math.ceil(total_items / ITEMS_PER_PAGE))
+    page = max(1, min(page, total_pages))
     items = conn.execute(
         """
         SELECT DISTINCT m.*
@@ -867,11 +1411,12 @@ def person_gallery(cluster_id):
         JOIN faces f ON m.drive_id = f.drive_id
         WHERE f.cluster_id = ?
         ORDER BY m.uploaded_date DESC
+        LIMIT ? OFFSET ?
         """,
-        (cluster_id,),
+        (cluster_id, ITEMS_PER_PAGE, (page - 1) * ITEMS_PER_PAGE),
     ).fetchall()
-    conn.close()
-    paginated = paginate_items(items, page)
+    release_db_connection(conn)
+    paginated = paginate_items(items, page, total_items)
     person_name = person["name"] if person else "Unknown"
     return render_template(
         "gallery_tailwind.html",
@@ -916,6 +1461,49 @@ def api_revoke_share_link(token):
         return jsonify({"error": str(exc)}), 500
 
 
+SHARED_MEDIA_SQL = (
+    "SELECT drive_id, filename, COALESCE(substr(uploaded_date, 1, 10), ''), ai_caption "
+    "FROM media WHERE status = 'approved' ORDER BY uploaded_date DESC LIMIT ? OFFSET ?"
+)
+
+
+def get_shared_media(page, per_page=SHARE_ITEMS_PER_PAGE):
+    conn = get_db_connection()
+    # One extra row tells the client whether to offer another page
+    rows = conn.execute(
+        SHARED_MEDIA_SQL, (per_page + 1, (max(page, 1) - 1) * per_page)
+    ).fetchall()
+    release_db_connection(conn)
+
+    thumb_prefix = "/thumbnail/"
+    download_prefix = "/download/"
+    media = [
+        {
+            "drive_id": r[0],
+            "filename": r[1],
+            "uploaded_date": r[2],
+            "ai_caption": r[3],
+            "thumbnail_url": thumb_prefix + r[0],
+            "download_url": download_prefix + r[0],
+        }
+        for r in rows[:per_page]
+    ]
+    return media, len(rows) > per_page
+
+
+@app.route("/api/share/<token>/media")
+def api_shared_media(token):
+    result = verify_share_link(token, count_view=False)
+    if not result:
+        abort(404)
+    if result.get("requires_password"):
+        return jsonify({"status": "denied"}), 401
+
+    page = request.args.get("page", 1, type=int)
+    media, has_more = get_shared_media(page)
+    return jsonify({"media": media, "page": page, "has_more": has_more})
+
+
 @app.route("/share/<token>/verify", methods=["POST"])
 def share_verify(token):
     data = request.json or {}
@@ -939,27 +1527,8 @@ def shared_view(token):
             token=token,
         )
 
-    conn = get_db_connection()
-    ensure_uploaded_dates(conn)
-    items = conn.execute(
-        "SELECT * FROM media WHERE status = 'approved' ORDER BY uploaded_date DESC"
-    ).fetchall()
-    conn.close()
-
     allow_download = bool(result.get("allow_download"))
-    media = []
-    for item in items:
-        uploaded_date = item["uploaded_date"] or ""
-        media.append(
-            {
-                "drive_id": item["drive_id"],
-                "filename": item["filename"],
-                "uploaded_date": uploaded_date[:10],
-                "ai_caption": item["ai_caption"],
-                "thumbnail_url": f"/thumbnail/{item['drive_id']}",
-                "download_url": f"/download/{item['drive_id']}",
-            }
-        )
+    media, has_more = get_shared_media(1)
 
     expires_date = result.get("expires_date") or "No expiration"
     max_views = result.get("max_views")
@@ -971,6 +1540,7 @@ def shared_view(token):
         token=token,
         share_name=result.get("name", "Shared Archive"),
         media=media,
+        has_more=has_more,
         allow_download=allow_download,
         expires_date=expires_date,
         max_views=max_views,
@@ -988,39 +1558,55 @@ def bulk_action():
 
     conn = get_db_connection()
     has_reviewed_date = column_exists(conn, "media", "reviewed_date")
-    if has_reviewed_date:
-        conn.executemany(
-            "UPDATE media SET status = ?, reviewed_date = ? WHERE drive_id = ?",
-            [(status, reviewed_date, d_id) for d_id in drive_ids],
-        )
-    else:
-        conn.executemany(
-            "UPDATE media SET status = ? WHERE drive_id = ?",
-            [(status, d_id) for d_id in drive_ids],
-        )
-    conn.commit()
-    conn.close()
+    set_sql = "status = ?, reviewed_date = ?" if has_reviewed_date else "status = ?"
+    set_params = [status, reviewed_date] if has_reviewed_date else [status]
+
+    # One UPDATE in one write transaction, so the batch costs a single commit
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if len(drive_ids) <= SQLITE_MAX_VARIABLES - len(set_params):
+            placeholders = ",".join("?" for _ in drive_ids)
+            conn.execute(
+                f"UPDATE media SET {set_sql} WHERE drive_id IN ({placeholders})",
+                [*set_params, *drive_ids],
+            )
+        else:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_ids (drive_id TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM temp.bulk_ids")
+            conn.executemany(
+                "INSERT OR IGNORE INTO temp.bulk_ids (drive_id) VALUES (?)",
+                ((d_id,) for d_id in drive_ids),
+            )
+            conn.execute(
+                f"UPDATE media SET {set_sql} WHERE drive_id IN (SELECT drive_id FROM temp.bulk_ids)",
+                set_params,
+            )
+            conn.execute("DELETE FROM temp.bulk_ids")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_db_connection(conn)
     return jsonify({"status": "success", "count": len(drive_ids)})
 
 
 @app.route("/thumbnail/<drive_id>")
 def get_thumbnail(drive_id):
-    file_stream = drive_get_media_stream(drive_id)
-    if not file_stream:
+    if not DRIVE_ID_RE.match(drive_id):
         abort(404)
-    return send_file(file_stream, mimetype="image/jpeg")
+    cache_path = THUMB_CACHE_DIR / f"{drive_id}.jpg"
+    if cache_path.is_file():
+        return send_file(cache_path, mimetype="image/jpeg", conditional=True)
+    return drive_media_response(drive_id, "image/jpeg", cache_path=cache_path)
 
 
 @app.route("/download/<drive_id>")
 def download_media(drive_id):
-    file_stream = drive_get_media_stream(drive_id)
-    if not file_stream:
-        abort(404)
-    return send_file(
-        file_stream,
-        mimetype="application/octet-stream",
-        as_attachment=True,
-        download_name=f"{drive_id}.bin",
+    return drive_media_response(
+        drive_id,
+        "application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{drive_id}.bin"'},
     )
 
 
@@ -1043,48 +1629,148 @@ def video_player(drive_id):
 
 @app.route("/api/stream/<drive_id>")
 def stream_video(drive_id):
-    return jsonify({"error": "Video streaming not yet implemented"}), 501
+    if not DRIVE_ID_RE.match(drive_id):
+        abort(404)
+    service = get_drive_service()
+    if not service:
+        abort(404)
+    try:
+        meta = service.files().get(fileId=drive_id, fields="size, mimeType").execute()
+        size = int(meta.get("size") or 0)
+        mimetype = meta.get("mimeType") or "video/mp4"
+        byte_range = parse_range_header(request.headers.get("Range"), size)
+    except RequestedRangeNotSatisfiable:
+        release_drive_service(service)
+        raise
+    except Exception:
+        release_drive_service(service)
+        abort(404)
+
+    if byte_range is None:
+        release_drive_service(service)
+        headers = {"Accept-Ranges": "bytes"}
+        if size:
+            headers["Content-Length"] = str(size)
+        return drive_media_response(drive_id, mimetype, headers=headers)
+
+    # Seeks fetch just the requested window from Drive instead of the whole file;
+    # the player asks for the rest as it needs it
+    start, end = byte_range
+    end = min(end, start + DRIVE_CHUNK_SIZE - 1)
+    try:
+        media_request = service.files().get_media(fileId=drive_id)
+        media_request.headers["Range"] = f"bytes={start}-{end}"
+        resp, content = media_request.http.request(
+            media_request.uri, method="GET", headers=media_request.headers
+        )
+    except Exception:
+        abort(404)
+    finally:
+        release_drive_service(service)
+
+    if resp.status == 206:
+        return Response(
+            content,
+            206,
+            mimetype=mimetype,
+            headers={
+                "Accept-Ranges": "bytes",
+                "Content-Range": resp.get("content-range")
+                or f"bytes {start}-{start + len(content) - 1}/{size}",
+                "Content-Length": str(len(content)),
+            },
+        )
+    if resp.status == 200:
+        # Drive ignored the Range header and sent the whole file, so pass it on as such
+        return Response(content, 200, mimetype=mimetype)
+    if resp.status == 416:
+        raise RequestedRangeNotSatisfiable(length=size)
+    abort(404)
+
+
+SEGMENT_SEPARATOR = "\x00"
+
+
+# Keyed on the stored segments_json, so an edited transcript is simply a cache miss
+@functools.lru_cache(maxsize=512)
+def _searchable_segments(segments_json):
+    try:
+        segments = json_loads(segments_json) if segments_json else []
+    except (json.JSONDecodeError, TypeError):
+        return None
+    # One NUL-separated haystack plus each segment's start offset, so a search is a few str.find calls
+    texts = [(seg.get("text") or "").lower() for seg in segments]
+    starts = list(itertools.accumulate((len(t) + 1 for t in texts[:-1]), initial=0))
+    return SEGMENT_SEPARATOR.join(texts), starts, segments
+
+
+def _find_segments(searchable, query, limit):
+    haystack, starts, segments = searchable
+    found = []
+    pos = haystack.find(query)
+    while pos >= 0 and len(found) < limit:
+        i = bisect.bisect_right(starts, pos) - 1
+        found.append(segments[i])
+        # Resume at the next segment so each one is reported once
+        if i + 1 == len(starts):
+            break
+        pos = haystack.find(query, starts[i + 1])
+    return found
 
 
 @app.route("/api/search-transcripts", methods=["POST"])
 def search_transcripts():
     data = request.json or {}
-    query = (data.get("query") or "").lower().strip()
+    query = (data.get("query") or "").lower().replace(SEGMENT_SEPARATOR, "").strip()
     if not query:
         return jsonify([])
 
     conn = get_db_connection()
     if not transcript_table_exists(conn):
-        conn.close()
+        release_db_connection(conn)
         return jsonify([])
 
-    rows = conn.execute(
-        """
-        SELECT t.media_id, m.filename, t.full_text, t.segments_json
-        FROM transcripts t
-        JOIN media m ON t.media_id = m.drive_id
-        WHERE t.full_text LIKE ? AND m.status = 'approved'
-        """,
-        (f"%{query}%",),
-    ).fetchall()
-    conn.close()
+    # full_text is only filtered on, never returned, so it stays out of the row
+    if table_exists(conn, "transcripts_fts"):
+        # Phrase match with a prefix on the last token, answered from the FTS index
+        match = '"' + query.replace('"', '""') + '"*'
+        cursor = conn.execute(
+            """
+            SELECT t.media_id, m.filename, t.segments_json
+            FROM transcripts_fts f
+            JOIN transcripts t ON t.rowid = f.rowid
+            JOIN media m ON t.media_id = m.drive_id
+            WHERE transcripts_fts MATCH ? AND m.status = 'approved'
+            """,
+            (match,),
+        )
+    else:
+        cursor = conn.execute(
+            """
+            SELECT t.media_id, m.filename, t.segments_json
+            FROM transcripts t
+            JOIN media m ON t.media_id = m.drive_id
+            WHERE t.full_text LIKE ? AND m.status = 'approved'
+            """,
+            (f"%{query}%",),
+        )
 
+    # Rows are decoded as SQLite steps through them rather than materialised up front
     results = []
-    for row in rows:
-        try:
-            segments = json.loads(row[3])
-        except json.JSONDecodeError:
-            continue
-        matching_segments = [
-            seg for seg in segments if query in (seg.get("text") or "").lower()
-        ]
-        results.append(
-            {
-                "drive_id": row[0],
-                "filename": row[1],
-                "matching_segments": matching_segments[:3],
-            }
-        )
+    try:
+        for drive_id, filename, segments_json in cursor:
+            searchable = _searchable_segments(segments_json)
+            if searchable is None:
+                continue
+            results.append(
+                {
+                    "drive_id": drive_id,
+                    "filename": filename,
+                    "matching_segments": _find_segments(searchable, query, 3),
+                }
+            )
+    finally:
+        release_db_connection(conn)
     return jsonify(results)
 
 
@@ -1,32 +1,113 @@
 import sqlite3
 import os
 import json
-from flask import Flask, render_template, request, jsonify, send_from_directory
+import time
+from flask import Flask, render_template, request, jsonify, g, send_from_directory, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.exceptions import NotFound
 from datetime import datetime
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
 
 # --- Configuration ---
 # Ensure these match your actual folder names
 DB_NAME = "archive.db"
 MEDIA_FOLDER = "media" 
 THUMBNAIL_FOLDER = "thumbnails" # Or "cache" if you named it that
+_VIDEO_EXTS = frozenset({'mp4', 'mov', 'avi', 'mkv'})
+_VIDEO_GLOB_SQL = ' OR '.join(f"lower(filename) GLOB '*.{ext}'" for ext in sorted(_VIDEO_EXTS))
+# api_recent's row shape, computed by SQLite instead of a per-row Python loop
+_RECENT_VIEW_SQL = f"""
+    CREATE VIEW IF NOT EXISTS v_recent AS
+    SELECT id,
+           CASE WHEN {_VIDEO_GLOB_SQL}
+                THEN 'video' ELSE 'photo' END AS type,
+           filename AS title,
+           COALESCE(NULLIF(substr(upload_date, 1, 10), ''), 'Unknown') AS date,
+           'http://localhost:5000/thumbnails/' || filename || '.jpg' AS thumbnail
+    FROM media_files
+    ORDER BY upload_date DESC
+"""
+STATS_TTL_SECONDS = 10
+# Inline grey tile so missing thumbnails cost no extra request
+PLACEHOLDER_THUMBNAIL = (
+    "data:image/svg+xml;utf8,"
+    "<svg xmlns='http://www.w3.org/2000/svg' width='16' height='9'><rect width='16' height='9' fill='%23374151'/></svg>"
+)
+
+# orjson encodes in C straight to bytes; Flask's default() still covers the odd types
+class ORJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+def dumps_bytes(obj):
+    return orjson.dumps(obj) if orjson is not None else json.dumps(obj).encode()
 
 app = Flask(__name__)
+if orjson is not None:
+    app.json = ORJSONProvider(app)
 # Enable CORS so the React app (port 5173) can talk to this Flask app (port 5000)
 CORS(app) 
 
 def get_db_connection():
-    if not os.path.exists(DB_NAME):
-        print(f"WARNING: {DB_NAME} not found. Ensure you are running this script from the project root.")
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # One connection per request, reused by every helper and closed at teardown
+    if 'db' not in g:
+        if not os.path.exists(DB_NAME):
+            print(f"WARNING: {DB_NAME} not found. Ensure you are running this script from the project root.")
+        g.db = sqlite3.connect(DB_NAME, check_same_thread=False)
+        g.db.row_factory = sqlite3.Row
+        # WAL lets readers carry on during writes; the rest are per-connection tuning
+        g.db.execute('PRAGMA journal_mode=WAL')
+        g.db.execute('PRAGMA synchronous=NORMAL')
+        g.db.execute('PRAGMA temp_store=MEMORY')
+        g.db.execute('PRAGMA mmap_size=268435456')
+        g.db.execute('PRAGMA cache_size=-65536')
+    return g.db
+
+@app.teardown_appcontext
+def close_db_connection(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
+
+# Names in THUMBNAIL_FOLDER, rescanned only when the directory's mtime changes
+_thumb_set = frozenset()
+_thumb_mtime = None
+
+def _refresh_thumbs():
+    global _thumb_set, _thumb_mtime
+    try:
+        mtime = os.stat(THUMBNAIL_FOLDER).st_mtime
+    except FileNotFoundError:
+        _thumb_set, _thumb_mtime = frozenset(), None
+        return _thumb_set
+    if mtime != _thumb_mtime:
+        with os.scandir(THUMBNAIL_FOLDER) as entries:
+            _thumb_set = frozenset(e.name for e in entries if e.is_file())
+        _thumb_mtime = mtime
+    return _thumb_set
 
 # --- API Routes ---
 
+# (computed_at, payload); the counts are whole-table scans, so reuse them briefly
+_stats_cache = (0.0, None)
+
 @app.route('/api/stats')
 def api_stats():
     """Returns system statistics for the React Dashboard."""
+    global _stats_cache
+    cached_at, cached = _stats_cache
+    if cached is not None and time.monotonic() - cached_at < STATS_TTL_SECONDS:
+        return jsonify(cached)
+
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -53,44 +134,50 @@ def api_stats():
     except:
         video_hours = "0 hrs"
 
-    conn.close()
     
-    return jsonify([
+    stats = [
         {'label': 'Total Memories', 'value': f"{total_files:,}", 'icon': 'Database', 'color': 'text-blue-400'},
         {'label': 'Faces Indexed', 'value': str(total_faces), 'icon': 'Users', 'color': 'text-purple-400'},
         {'label': 'Searchable Video', 'value': video_hours, 'icon': 'FileVideo', 'color': 'text-emerald-400'},
         {'label': 'System Status', 'value': 'Online', 'icon': 'Activity', 'color': 'text-green-400'},
-    ])
+    ]
+    _stats_cache = (time.monotonic(), stats)
+    return jsonify(stats)
 
 @app.route('/api/recent')
 def api_recent():
     """Returns the most recent media files."""
     conn = get_db_connection()
+    # v_recent already shapes each row; only the thumbnail check needs the filesystem
     try:
-        # Fetch top 12 recent files
-        files = conn.execute("SELECT * FROM media_files ORDER BY upload_date DESC LIMIT 12").fetchall()
-    except:
-        files = []
-    conn.close()
+        files = conn.execute("SELECT * FROM v_recent LIMIT 12").fetchall()
+    except sqlite3.OperationalError:
+        # Not started through __main__, so ensure_schema never ran; create the view now
+        try:
+            conn.execute(_RECENT_VIEW_SQL)
+            files = conn.execute("SELECT * FROM v_recent LIMIT 12").fetchall()
+        except sqlite3.OperationalError:
+            files = []
     
-    recent_items = []
-    for f in files:
-        # Determine type based on extension
-        filename = f['filename']
-        is_video = filename.lower().endswith(('.mp4', '.mov', '.avi', '.mkv'))
-        item_type = 'video' if is_video else 'photo'
-        
-        # Use existing thumbnail logic
-        recent_items.append({
-            'id': f['id'],
-            'type': item_type,
-            'title': filename,
-            'date': f['upload_date'][:10] if f['upload_date'] else 'Unknown',
-            'thumbnail': f"http://localhost:5000/thumbnails/{filename}.jpg" 
-        })
+    recent_items = [dict(f) for f in files]
+    thumbs = _refresh_thumbs()
+    for item in recent_items:
+        if f"{item['title']}.jpg" not in thumbs:
+            item['thumbnail'] = PLACEHOLDER_THUMBNAIL
         
     return jsonify(recent_items)
 
+# Keyed on mtime so a re-transcribed file is picked up without explicit invalidation.
+# Caches the encoded response body, so a repeat request does no serialization at all.
+@lru_cache(maxsize=256)
+def _load_transcript_cached(path, mtime):
+    with open(path, 'rb') as f:
+        data = orjson.loads(f.read()) if orjson is not None else json.load(f)
+    return dumps_bytes([
+        {'time': f"{int(s['start'] // 60):02}:{int(s['start'] % 60):02}", 'text': s['text']}
+        for s in data.get('segments', [])
+    ])
+
 @app.route('/api/transcript/<int:video_id>')
 def api_transcript(video_id):
     """Returns transcript segments for the video player."""
@@ -100,21 +187,14 @@ def api_transcript(video_id):
         video = conn.execute("SELECT filename, transcript_path FROM media_files WHERE id = ?", (video_id,)).fetchone()
     except:
         video = None
-    conn.close()
     
     if not video or not video['transcript_path'] or not os.path.exists(video['transcript_path']):
         return jsonify([]) 
 
     try:
-        with open(video['transcript_path'], 'r') as f:
-            data = json.load(f)
-            segments = []
-            for seg in data.get('segments', []):
-                start = seg['start']
-                m, s = divmod(start, 60)
-                time_str = f"{int(m):02}:{int(s):02}"
-                segments.append({'time': time_str, 'text': seg['text']})
-            return jsonify(segments)
+        path = video['transcript_path']
+        # Already-encoded bytes go out as-is, skipping jsonify's decode/encode round trip
+        return Response(_load_transcript_cached(path, os.path.getmtime(path)), mimetype='application/json')
     except Exception as e:
         print(f"Error reading transcript: {e}")
         return jsonify([{'time': '00:00', 'text': 'Error loading transcript.'}])
@@ -127,7 +207,6 @@ def api_shares():
         shares = conn.execute("SELECT * FROM shared_links ORDER BY created_at DESC").fetchall()
     except:
         shares = []
-    conn.close()
     
     share_list = []
     for s in shares:
@@ -145,10 +224,11 @@ def api_shares():
 
 @app.route('/thumbnails/<filename>')
 def serve_thumbnail(filename):
-    # Tries to find the thumbnail, serves a placeholder if missing
-    if os.path.exists(os.path.join(THUMBNAIL_FOLDER, filename)):
-        return send_from_directory(THUMBNAIL_FOLDER, filename)
-    return "Thumbnail not found", 404
+    # send_from_directory already stats the file, so let it report a miss
+    try:
+        return send_from_directory(THUMBNAIL_FOLDER, filename, max_age=86400)
+    except NotFound:
+        return "Thumbnail not found", 404
 
 @app.route('/media/<filename>')
 def serve_media(filename):
@@ -158,6 +238,21 @@ def serve_media(filename):
 def home():
     return "Family Archive Backend v12 is Running! Open <a href='http://localhost:5173'>http://localhost:5173</a> to view your Vault."
 
+def ensure_schema():
+    conn = sqlite3.connect(DB_NAME)
+    try:
+        # Partial index covering SUM(duration) for videos, so the stat never reads the table
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_mf_video_duration ON media_files(file_type, duration) WHERE file_type = 'video'")
+    except sqlite3.OperationalError:
+        pass
+    # Separate from the index so a failure there cannot leave api_recent without its view
+    try:
+        conn.execute(_RECENT_VIEW_SQL)
+    except sqlite3.OperationalError:
+        pass
+    conn.close()
+
 if __name__ == '__main__':
     print("Starting Family Archive Backend on Port 5000...")
+    ensure_schema()
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -1,12 +1,15 @@
 import os
 import sqlite3
 import json
+import re
 from datetime import datetime
-from flask import Flask, render_template, jsonify, request, send_file
+from flask import Flask, render_template, jsonify, g, make_response, request, send_file
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 import io
+import threading
+from pathlib import Path
 import math
 
 app = Flask(__name__)
@@ -15,22 +18,53 @@ app = Flask(__name__)
 DB_PATH = r'F:\FamilyArchive\data\archive.db'
 SERVICE_ACCOUNT_FILE = r'F:\FamilyArchive\config\service-account.json'
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+THUMBNAIL_CACHE_CONTROL = 'public, max-age=86400, immutable'
+THUMBNAIL_CACHE_DIR = Path(os.path.dirname(os.path.abspath(__file__))) / 'cache' / 'thumbs'
+THUMBNAIL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+# Drive IDs are URL-safe base64; anything else must not reach a cache path
+DRIVE_ID_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+# Stays under SQLite's default 999 bound parameters, leaving room for status and date
+BULK_BATCH_SIZE = 900
 ITEMS_PER_PAGE = 12
 
 # --- GOOGLE DRIVE SETUP ---
+_drive_local = threading.local()
+
 def get_drive_service():
-    creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    return build('drive', 'v3', credentials=creds)
+    # Built once per thread: the client is costly to build and httplib2 is not thread-safe
+    service = getattr(_drive_local, 'service', None)
+    if service is None:
+        creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+        service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+        _drive_local.service = service
+    return service
 
 # --- DATABASE HELPERS ---
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # One connection per request, reused by every helper and closed at teardown
+    if 'db' not in g:
+        g.db = sqlite3.connect(DB_PATH, check_same_thread=False)
+        g.db.row_factory = sqlite3.Row
+        # WAL lets readers carry on during writes; the rest are per-connection tuning
+        g.db.execute('PRAGMA journal_mode=WAL')
+        g.db.execute('PRAGMA synchronous=NORMAL')
+        g.db.execute('PRAGMA temp_store=MEMORY')
+        g.db.execute('PRAGMA mmap_size=268435456')
+        g.db.execute('PRAGMA cache_size=-65536')
+    return g.db
+
+@app.teardown_appcontext
+def close_db_connection(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
 
 # --- PAGINATION HELPER ---
-def paginate_items(items, page=1):
-    total_items = len(items)
+def paginate_items(items, page=1, total_items=None):
+    # With total_items given, items is already the requested page from SQL
+    sliced = total_items is None
+    if sliced:
+        total_items = len(items)
     if total_items == 0:
         return {'items': [], 'current_page': 1, 'total_pages': 1, 'total_items': 0, 'has_prev': False, 'has_next': False}
     
@@ -41,7 +75,7 @@ def paginate_items(items, page=1):
     end_idx = start_idx + ITEMS_PER_PAGE
     
     return {
-        'items': items[start_idx:end_idx],
+        'items': items[start_idx:end_idx] if sliced else items,
         'current_page': page,
         'total_pages': total_pages,
         'total_items': total_items,
@@ -54,99 +88,81 @@ def paginate_items(items, page=1):
 @app.route('/')
 def dashboard():
     conn = get_db_connection()
-    stats = conn.execute('''
-        SELECT 
-            COUNT(*) as total,
-            SUM(case when status = 'pending' then 1 else 0 end) as pending,
-            SUM(case when status = 'approved' then 1 else 0 end) as approved,
-            SUM(case when status = 'rejected' then 1 else 0 end) as rejected
-        FROM media
-    ''').fetchone()
+    # GROUP BY walks idx_media_status instead of evaluating four CASEs per row
+    counts = dict(conn.execute('SELECT status, COUNT(*) FROM media GROUP BY status').fetchall())
+    stats = {
+        'total': sum(counts.values()),
+        'pending': counts.get('pending', 0),
+        'approved': counts.get('approved', 0),
+        'rejected': counts.get('rejected', 0),
+    }
     
     recent_items = conn.execute('SELECT * FROM media ORDER BY uploaded_date DESC LIMIT 6').fetchall()
-    conn.close()
     return render_template('dashboard.html', stats=stats, recent_items=recent_items)
 
-def get_gallery_items(status, search_query, sort_by):
-    conn = get_db_connection()
-    
-    # Base query
-    query = f"SELECT * FROM media WHERE status = ?"
-    params = [status]
-    
-    # Search
-    if search_query:
-        query += " AND filename LIKE ?"
-        params.append(f'%{search_query}%')
-    
-    # Sorting
-    if sort_by == 'oldest':
-        query += " ORDER BY uploaded_date ASC"
-    elif sort_by == 'date_taken_newest':
-        query += " ORDER BY COALESCE(date_taken, uploaded_date) DESC"
-    elif sort_by == 'date_taken_oldest':
-        query += " ORDER BY COALESCE(date_taken, uploaded_date) ASC"
-    elif sort_by == 'filename_asc':
-        query += " ORDER BY filename ASC"
-    elif sort_by == 'filename_desc':
-        query += " ORDER BY filename DESC"
-    else:  # newest (default)
-        query += " ORDER BY uploaded_date DESC"
-    
-    items = conn.execute(query, params).fetchall()
-    conn.close()
-    return items
+# Every SQL string is built once here, so each call reuses the same text and hits sqlite3's statement cache
+GALLERY_ORDER_BY = {
+    'newest': 'uploaded_date DESC',
+    'oldest': 'uploaded_date ASC',
+    'date_taken_newest': 'COALESCE(date_taken, uploaded_date) DESC',
+    'date_taken_oldest': 'COALESCE(date_taken, uploaded_date) ASC',
+    'filename_asc': 'filename ASC',
+    'filename_desc': 'filename DESC',
+}
+GALLERY_WHERE = {
+    False: 'status = ?',
+    True: 'status = ? AND filename LIKE ?',
+}
+GALLERY_COUNT_SQL = {
+    searching: f"SELECT COUNT(*) FROM media WHERE {where}"
+    for searching, where in GALLERY_WHERE.items()
+}
+GALLERY_PAGE_SQL = {
+    (sort_by, searching): f"SELECT * FROM media WHERE {where} ORDER BY {order_by} LIMIT ? OFFSET ?"
+    for sort_by, order_by in GALLERY_ORDER_BY.items()
+    for searching, where in GALLERY_WHERE.items()
+}
+GALLERY_TITLES = {
+    'pending': 'Pending Review',
+    'approved': 'Approved Archive',
+    'rejected': 'Rejected Items',
+}
 
-@app.route('/pending')
-def pending_review():
-    search_query = request.args.get('search', '')
-    page = request.args.get('page', 1, type=int)
-    sort_by = request.args.get('sort', 'newest')
-    
-    items = get_gallery_items('pending', search_query, sort_by)
-    paginated = paginate_items(items, page)
+def get_gallery_items(status, search_query, sort_by, page=1):
+    conn = get_db_connection()
+    searching = bool(search_query)
+    if sort_by not in GALLERY_ORDER_BY:
+        sort_by = 'newest'
+    params = [status, f'%{search_query}%'] if searching else [status]
     
-    return render_template('gallery.html', 
-                         title="Pending Review", 
-                         items=paginated['items'], 
-                         status_filter="pending", 
-                         search_query=search_query,
-                         sort_by=sort_by,
-                         pagination=paginated)
+    # Count first so the page can be clamped, then fetch only that page
+    total_items = conn.execute(GALLERY_COUNT_SQL[searching], params).fetchone()[0]
+    total_pages = max(math.ceil(total_items / ITEMS_PER_PAGE), 1)
+    page = max(1, min(page, total_pages))
+    items = conn.execute(GALLERY_PAGE_SQL[sort_by, searching],
+                         params + [ITEMS_PER_PAGE, (page - 1) * ITEMS_PER_PAGE]).fetchall()
+    return items, total_items
 
-@app.route('/approved')
-def approved_items():
+def gallery(status):
     search_query = request.args.get('search', '')
     page = request.args.get('page', 1, type=int)
     sort_by = request.args.get('sort', 'newest')
     
-    items = get_gallery_items('approved', search_query, sort_by)
-    paginated = paginate_items(items, page)
+    items, total_items = get_gallery_items(status, search_query, sort_by, page)
+    paginated = paginate_items(items, page, total_items)
     
     return render_template('gallery.html', 
-                         title="Approved Archive", 
+                         title=GALLERY_TITLES[status], 
                          items=paginated['items'], 
-                         status_filter="approved", 
+                         status_filter=status, 
                          search_query=search_query,
                          sort_by=sort_by,
                          pagination=paginated)
 
-@app.route('/rejected')
-def rejected_items():
-    search_query = request.args.get('search', '')
-    page = request.args.get('page', 1, type=int)
-    sort_by = request.args.get('sort', 'newest')
-    
-    items = get_gallery_items('rejected', search_query, sort_by)
-    paginated = paginate_items(items, page)
-    
-    return render_template('gallery.html', 
-                         title="Rejected Items", 
-                         items=paginated['items'], 
-                         status_filter="rejected", 
-                         search_query=search_query,
-                         sort_by=sort_by,
-                         pagination=paginated)
+# Endpoint names are kept so existing url_for() calls still resolve
+app.add_url_rule('/pending', 'pending_review', lambda: gallery('pending'))
+app.add_url_rule('/approved', 'approved_items', lambda: gallery('approved'))
+app.add_url_rule('/rejected', 'rejected_items', lambda: gallery('rejected'))
 
 # --- API ENDPOINTS ---
 
@@ -157,7 +173,6 @@ def approve_item(drive_id):
         conn.execute("UPDATE media SET status = 'approved', reviewed_date = ? WHERE drive_id = ?", 
                     (datetime.now().isoformat(), drive_id))
         conn.commit()
-        conn.close()
         return jsonify({"status": "success", "message": "Item approved"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -169,7 +184,6 @@ def reject_item(drive_id):
         conn.execute("UPDATE media SET status = 'rejected', reviewed_date = ? WHERE drive_id = ?", 
                     (datetime.now().isoformat(), drive_id))
         conn.commit()
-        conn.close()
         return jsonify({"status": "success", "message": "Item rejected"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -188,30 +202,62 @@ def bulk_action():
         reviewed_date = datetime.now().isoformat()
         
         conn = get_db_connection()
-        conn.executemany("UPDATE media SET status = ?, reviewed_date = ? WHERE drive_id = ?", 
-                         [(status, reviewed_date, d_id) for d_id in drive_ids])
+        conn.execute("BEGIN IMMEDIATE")
+        # One UPDATE per batch of ids rather than one per id, all in the same transaction
+        for start in range(0, len(drive_ids), BULK_BATCH_SIZE):
+            batch = drive_ids[start:start + BULK_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            conn.execute(f"UPDATE media SET status = ?, reviewed_date = ? WHERE drive_id IN ({placeholders})",
+                         [status, reviewed_date, *batch])
         conn.commit()
-        conn.close()
         
         return jsonify({"status": "success", "message": f"{len(drive_ids)} items {action}ed", "count": len(drive_ids)})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def with_thumbnail_caching(resp, drive_id):
+    resp.headers['Cache-Control'] = THUMBNAIL_CACHE_CONTROL
+    resp.set_etag(drive_id)
+    return resp
+
 @app.route('/thumbnail/<drive_id>')
 def get_thumbnail(drive_id):
+    if not DRIVE_ID_RE.match(drive_id):
+        return make_response('', 404)
+    # Drive IDs name immutable objects, so a revalidation can skip the download entirely
+    if drive_id in request.if_none_match:
+        return with_thumbnail_caching(make_response('', 304), drive_id)
     try:
-        service = get_drive_service()
-        request_obj = service.files().get_media(fileId=drive_id)
-        file_stream = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_stream, request_obj)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
-        
-        file_stream.seek(0)
-        return send_file(file_stream, mimetype='image/jpeg')
+        cache_path = THUMBNAIL_CACHE_DIR / f'{drive_id}.jpg'
+        if not cache_path.exists():
+            service = get_drive_service()
+            request_obj = service.files().get_media(fileId=drive_id)
+            file_stream = io.BytesIO()
+            downloader = MediaIoBaseDownload(file_stream, request_obj)
+            done = False
+            while done is False:
+                status, done = downloader.next_chunk()
+            # Publish atomically so a concurrent request never serves a half-written file
+            tmp_path = cache_path.with_name(f'{drive_id}.{threading.get_ident()}.part')
+            tmp_path.write_bytes(file_stream.getvalue())
+            os.replace(tmp_path, cache_path)
+        return with_thumbnail_caching(send_file(cache_path, mimetype='image/jpeg'), drive_id)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def ensure_indexes():
+    conn = sqlite3.connect(DB_PATH)
+    conn.executescript('''
+        CREATE INDEX IF NOT EXISTS idx_media_status ON media(status);
+        CREATE INDEX IF NOT EXISTS idx_media_drive_id ON media(drive_id);
+        CREATE INDEX IF NOT EXISTS idx_media_uploaded_date ON media(uploaded_date DESC);
+        -- One per gallery sort so ORDER BY ... LIMIT reads the page straight off the index
+        CREATE INDEX IF NOT EXISTS idx_media_status_uploaded ON media(status, uploaded_date DESC);
+        CREATE INDEX IF NOT EXISTS idx_media_status_date_taken ON media(status, COALESCE(date_taken, uploaded_date) DESC);
+        CREATE INDEX IF NOT EXISTS idx_media_status_filename ON media(status, filename);
+    ''')
+    conn.close()
+
 if __name__ == '__main__':
+    ensure_indexes()
     app.run(debug=True, port=5000)
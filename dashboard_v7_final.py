@@ -2,7 +2,7 @@ import os
 import sqlite3
 import json
 from datetime import datetime
-from flask import Flask, render_template, jsonify, request, send_file
+from flask import Flask, render_template, jsonify, g, request, send_file
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
@@ -26,9 +26,23 @@ def get_drive_service():
     return build('drive', 'v3', credentials=creds)
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # One connection per request, reused by every helper and closed at teardown
+    if 'db' not in g:
+        g.db = sqlite3.connect(DB_PATH, check_same_thread=False)
+        g.db.row_factory = sqlite3.Row
+        # WAL lets readers carry on during writes; the rest are per-connection tuning
+        g.db.execute('PRAGMA journal_mode=WAL')
+        g.db.execute('PRAGMA synchronous=NORMAL')
+        g.db.execute('PRAGMA temp_store=MEMORY')
+        g.db.execute('PRAGMA mmap_size=268435456')
+        g.db.execute('PRAGMA cache_size=-65536')
+    return g.db
+
+@app.teardown_appcontext
+def close_db_connection(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
 
 def paginate_items(items, page=1):
     total_items = len(items)
@@ -50,16 +64,15 @@ def paginate_items(items, page=1):
 @app.route('/')
 def dashboard():
     conn = get_db_connection()
-    stats = conn.execute('''
-        SELECT 
-            COUNT(*) as total,
-            SUM(case when status = 'pending' then 1 else 0 end) as pending,
-            SUM(case when status = 'approved' then 1 else 0 end) as approved,
-            SUM(case when status = 'rejected' then 1 else 0 end) as rejected
-        FROM media
-    ''').fetchone()
+    # GROUP BY walks idx_media_status instead of evaluating four CASEs per row
+    counts = dict(conn.execute('SELECT status, COUNT(*) FROM media GROUP BY status').fetchall())
+    stats = {
+        'total': sum(counts.values()),
+        'pending': counts.get('pending', 0),
+        'approved': counts.get('approved', 0),
+        'rejected': counts.get('rejected', 0),
+    }
     recent_items = conn.execute('SELECT * FROM media ORDER BY uploaded_date DESC LIMIT 6').fetchall()
-    conn.close()
     return render_template('dashboard.html', stats=stats, recent_items=recent_items)
 
 @app.route('/people')
@@ -72,7 +85,6 @@ def people_view():
         JOIN faces f2 ON c.id = f2.cluster_id
         GROUP BY c.id
     ''').fetchall()
-    conn.close()
     return render_template('people.html', people=people)
 
 @app.route('/person/<int:cluster_id>')
@@ -87,7 +99,6 @@ def person_gallery(cluster_id):
         WHERE f.cluster_id = ?
         ORDER BY m.uploaded_date DESC
     ''', (cluster_id,)).fetchall()
-    conn.close()
     paginated = paginate_items(items, page)
     return render_template('gallery.html', title=f"Photos of {person['name']}", items=paginated['items'], status_filter="person", pagination=paginated)
 
@@ -104,7 +115,6 @@ def pending_review():
         conn = get_db_connection()
         placeholders = ','.join(['?' for _ in drive_ids])
         items = conn.execute(f"SELECT * FROM media WHERE status = 'pending' AND drive_id IN ({placeholders})", drive_ids).fetchall()
-        conn.close()
     else:
         items = get_gallery_items('pending', search_query, sort_by)
     
@@ -124,7 +134,6 @@ def approved_items():
         conn = get_db_connection()
         placeholders = ','.join(['?' for _ in drive_ids])
         items = conn.execute(f"SELECT * FROM media WHERE status = 'approved' AND drive_id IN ({placeholders})", drive_ids).fetchall()
-        conn.close()
     else:
         items = get_gallery_items('approved', search_query, sort_by)
     
@@ -152,7 +161,6 @@ def get_gallery_items(status, search_query, sort_by):
     else: query += " ORDER BY uploaded_date DESC"
     
     items = conn.execute(query, params).fetchall()
-    conn.close()
     return items
 
 @app.route('/api/bulk_action', methods=['POST'])
@@ -163,9 +171,9 @@ def bulk_action():
     status = 'approved' if action == 'approve' else 'rejected'
     reviewed_date = datetime.now().isoformat()
     conn = get_db_connection()
-    conn.executemany("UPDATE media SET status = ?, reviewed_date = ? WHERE drive_id = ?", [(status, reviewed_date, d_id) for d_id in drive_ids])
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany("UPDATE media SET status = ?, reviewed_date = ? WHERE drive_id = ?", ((status, reviewed_date, d_id) for d_id in drive_ids))
     conn.commit()
-    conn.close()
     return jsonify({"status": "success", "count": len(drive_ids)})
 
 @app.route('/thumbnail/<drive_id>')
@@ -180,5 +188,14 @@ def get_thumbnail(drive_id):
     file_stream.seek(0)
     return send_file(file_stream, mimetype='image/jpeg')
 
+def ensure_indexes():
+    conn = sqlite3.connect(DB_PATH)
+    conn.executescript('''
+        CREATE INDEX IF NOT EXISTS idx_media_status ON media(status);
+        CREATE INDEX IF NOT EXISTS idx_media_uploaded_date ON media(uploaded_date DESC);
+    ''')
+    conn.close()
+
 if __name__ == '__main__':
+    ensure_indexes()
     app.run(debug=True, port=5000)
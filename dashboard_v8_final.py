@@ -2,16 +2,25 @@ import os
 import sqlite3
 import json
 from datetime import datetime
-from flask import Flask, render_template, jsonify, request, send_file, abort
+from flask import Flask, render_template, jsonify, g, request, abort, make_response, Response
+from flask.json.provider import DefaultJSONProvider
+from flask_caching import Cache
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 import io
+import itertools
 import math
+import threading
 from semantic_search import semantic_search
-from duplicate_detection import get_duplicate_groups
+from duplicate_detection import load_duplicate_groups, refresh_duplicate_groups
 from sharing import generate_share_link, verify_share_link, get_all_share_links, revoke_share_link
 
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
 # --- CONFIGURATION ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
@@ -19,17 +28,57 @@ DB_PATH = r'F:\FamilyArchive\data\archive.db'
 SERVICE_ACCOUNT_FILE = r'F:\FamilyArchive\config\service-account.json'
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 ITEMS_PER_PAGE = 12
+# Drive IDs name immutable content, so browsers may keep a thumbnail for a week without asking
+THUMBNAIL_CACHE_CONTROL = 'public, max-age=604800, immutable'
+DRIVE_CHUNK_SIZE = 256 * 1024
+# Request threads for the production server; Drive downloads spend most of their time waiting
+SERVER_THREADS = 8
+# Rendered gallery pages are also keyed on media_version (person pages on people_version too),
+# so this only bounds memory, not staleness
+GALLERY_CACHE_SECONDS = 60
+
+# orjson handles jsonify() and request.json in C; Flask's default() still covers the odd types
+class ORJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__, template_folder=TEMPLATE_DIR)
+if orjson is not None:
+    app.json = ORJSONProvider(app)
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache'})
+
+_drive_local = threading.local()
 
 def get_drive_service():
-    creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    return build('drive', 'v3', credentials=creds)
+    # Built once per thread: the client is costly to build and httplib2 is not thread-safe
+    service = getattr(_drive_local, 'service', None)
+    if service is None:
+        creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+        service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+        _drive_local.service = service
+    return service
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # One connection per request, reused by every helper and closed at teardown
+    if 'db' not in g:
+        g.db = sqlite3.connect(DB_PATH, check_same_thread=False)
+        g.db.row_factory = sqlite3.Row
+        # WAL lets readers carry on during writes; the rest are per-connection tuning
+        g.db.execute('PRAGMA journal_mode=WAL')
+        g.db.execute('PRAGMA synchronous=NORMAL')
+        g.db.execute('PRAGMA temp_store=MEMORY')
+        g.db.execute('PRAGMA mmap_size=268435456')
+        g.db.execute('PRAGMA cache_size=-65536')
+    return g.db
+
+@app.teardown_appcontext
+def close_db_connection(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
 
 def paginate_items(items, page=1):
     total_items = len(items)
@@ -48,20 +97,65 @@ def paginate_items(items, page=1):
         'has_next': page < total_pages
     }
 
+def media_version():
+    """Counter bumped by triggers on every write to media, from this app or any worker."""
+    try:
+        return get_db_connection().execute('SELECT version FROM media_version').fetchone()[0]
+    except (sqlite3.OperationalError, TypeError):
+        return None  # ensure_media_version() hasn't run; callers then skip caching
+
+def people_version():
+    """Counter bumped by triggers on every write to faces or clusters."""
+    try:
+        return get_db_connection().execute('SELECT version FROM people_version').fetchone()[0]
+    except (sqlite3.OperationalError, TypeError):
+        return None  # ensure_people_version() hasn't run or the face worker hasn't yet
+
+def view_cache_key():
+    # Same URL + same data version = same page, so a hit can skip the queries and the render
+    return f"view:{media_version()}:{request.full_path}"
+
+def cached_view(view):
+    return cache.cached(timeout=GALLERY_CACHE_SECONDS, key_prefix=view_cache_key, unless=lambda: media_version() is None)(view)
+
+def person_view_cache_key():
+    # Face detection and clustering change a person's page without touching media
+    return f"person:{media_version()}:{people_version()}:{request.full_path}"
+
+def cached_person_view(view):
+    return cache.cached(
+        timeout=GALLERY_CACHE_SECONDS, key_prefix=person_view_cache_key,
+        unless=lambda: media_version() is None or people_version() is None)(view)
+
+# (media_version, stats)
+_stats_cache = (None, None)
+
+def get_dashboard_stats(conn):
+    global _stats_cache
+    version = media_version()
+    cached_version, stats = _stats_cache
+    if version is not None and version == cached_version:
+        return stats
+    # GROUP BY walks idx_media_status instead of evaluating four CASEs per row
+    counts = dict(conn.execute('SELECT status, COUNT(*) FROM media GROUP BY status').fetchall())
+    stats = {
+        'total': sum(counts.values()),
+        'pending': counts.get('pending', 0),
+        'approved': counts.get('approved', 0),
+        'rejected': counts.get('rejected', 0),
+    }
+    _stats_cache = (version, stats)
+    return stats
+
 @app.route('/')
 def dashboard():
     conn = get_db_connection()
-    stats = conn.execute('''
-        SELECT 
-            COUNT(*) as total,
-            SUM(case when status = 'pending' then 1 else 0 end) as pending,
-            SUM(case when status = 'approved' then 1 else 0 end) as approved,
-            SUM(case when status = 'rejected' then 1 else 0 end) as rejected
-        FROM media
-    ''').fetchone()
+    stats = get_dashboard_stats(conn)
     recent_items = conn.execute('SELECT * FROM media ORDER BY uploaded_date DESC LIMIT 6').fetchall()
-    conn.close()
-    return render_template('dashboard_tailwind.html', stats=stats, recent_items=recent_items)
+    # An unchanged page revalidates as a bodyless 304
+    resp = make_response(render_template('dashboard_tailwind.html', stats=stats, recent_items=recent_items))
+    resp.add_etag()
+    return resp.make_conditional(request)
 
 @app.route('/people')
 def people_view():
@@ -73,26 +167,22 @@ def people_view():
         JOIN faces f2 ON c.id = f2.cluster_id
         GROUP BY c.id
     ''').fetchall()
-    conn.close()
     return render_template('people.html', people=people)
 
 @app.route('/person/<int:cluster_id>')
+@cached_person_view
 def person_gallery(cluster_id):
-    page = request.args.get('page', 1, type=int)
     conn = get_db_connection()
     person = conn.execute("SELECT name FROM clusters WHERE id = ?", (cluster_id,)).fetchone()
-    items = conn.execute('''
-        SELECT DISTINCT m.* 
-        FROM media m
-        JOIN faces f ON m.drive_id = f.drive_id
-        WHERE f.cluster_id = ?
-        ORDER BY m.uploaded_date DESC
-    ''', (cluster_id,)).fetchall()
-    conn.close()
-    paginated = paginate_items(items, page)
+    # A semi-join probes idx_faces_cluster_drive per media row and stops at the page size,
+    # instead of DISTINCT over the whole faces join
+    items, paginated = get_keyset_page(
+        "EXISTS (SELECT 1 FROM faces f WHERE f.drive_id = media.drive_id AND f.cluster_id = ?)",
+        [cluster_id], 'newest', request.args.get('after'), request.args.get('before'))
     return render_template('gallery_tailwind.html', title=f"Photos of {person['name']}", items=paginated['items'], status_filter="person", pagination=paginated, search_query="", sort_by="newest")
 
 @app.route('/pending')
+@cached_view
 def pending_review():
     search_query = request.args.get('search', '')
     page = request.args.get('page', 1, type=int)
@@ -102,17 +192,16 @@ def pending_review():
     if search_mode == 'semantic' and search_query:
         results = semantic_search(search_query, top_k=100)
         drive_ids = [r[0] for r in results]
-        conn = get_db_connection()
-        placeholders = ','.join(['?' for _ in drive_ids])
-        items = conn.execute(f"SELECT * FROM media WHERE status = 'pending' AND drive_id IN ({placeholders})", drive_ids).fetchall()
-        conn.close()
+        items = get_semantic_items('pending', drive_ids)
+        # At most top_k rows, so page numbers over the list are fine here
+        paginated = paginate_items(items, page)
     else:
-        items = get_gallery_items('pending', search_query, sort_by)
+        items, paginated = get_gallery_items('pending', search_query, sort_by, request.args.get('after'), request.args.get('before'))
     
-    paginated = paginate_items(items, page)
     return render_template('gallery_tailwind.html', title="Pending Review", items=paginated['items'], status_filter="pending", search_query=search_query, sort_by=sort_by, pagination=paginated, search_mode=search_mode)
 
 @app.route('/approved')
+@cached_view
 def approved_items():
     search_query = request.args.get('search', '')
     page = request.args.get('page', 1, type=int)
@@ -122,19 +211,24 @@ def approved_items():
     if search_mode == 'semantic' and search_query:
         results = semantic_search(search_query, top_k=100)
         drive_ids = [r[0] for r in results]
-        conn = get_db_connection()
-        placeholders = ','.join(['?' for _ in drive_ids])
-        items = conn.execute(f"SELECT * FROM media WHERE status = 'approved' AND drive_id IN ({placeholders})", drive_ids).fetchall()
-        conn.close()
+        items = get_semantic_items('approved', drive_ids)
+        # At most top_k rows, so page numbers over the list are fine here
+        paginated = paginate_items(items, page)
     else:
-        items = get_gallery_items('approved', search_query, sort_by)
+        items, paginated = get_gallery_items('approved', search_query, sort_by, request.args.get('after'), request.args.get('before'))
     
-    paginated = paginate_items(items, page)
     return render_template('gallery_tailwind.html', title="Approved Archive", items=paginated['items'], status_filter="approved", search_query=search_query, sort_by=sort_by, pagination=paginated, search_mode=search_mode)
 
 @app.route('/duplicates')
 def duplicates_view():
-    duplicate_groups = get_duplicate_groups()
+    conn = get_db_connection()
+    # Groups are precomputed by refresh_duplicate_groups(); this is a plain indexed read
+    try:
+        duplicate_groups = load_duplicate_groups(conn)
+    except sqlite3.OperationalError:
+        # Nothing stored yet, so compute once here instead of on every visit
+        refresh_duplicate_groups()
+        duplicate_groups = load_duplicate_groups(conn)
     return render_template('duplicates.html', duplicate_groups=duplicate_groups)
 
 @app.route('/sharing')
@@ -164,29 +258,108 @@ def shared_view(token):
     
     conn = get_db_connection()
     items = conn.execute('SELECT * FROM media WHERE status = "approved" ORDER BY uploaded_date DESC').fetchall()
-    conn.close()
     
     paginated = paginate_items(items, 1)
     return render_template('gallery_tailwind.html', title=f"Shared: {link['name']}", items=paginated['items'], pagination=paginated, search_query="", sort_by="newest", is_shared=True)
 
-def get_gallery_items(status, search_query, sort_by):
-    conn = get_db_connection()
-    query = f"SELECT * FROM media WHERE status = ?"
+# sort_by -> (key expression, direction). Keys are NULL-free so (key, rowid) row values compare cleanly;
+# each key has a (status, key) index whose implicit rowid suffix breaks ties in the same order.
+GALLERY_SORT_KEYS = {
+    'newest': ("COALESCE(uploaded_date, '')", 'DESC'),
+    'oldest': ("COALESCE(uploaded_date, '')", 'ASC'),
+    'date_taken_newest': ("COALESCE(date_taken, uploaded_date, '')", 'DESC'),
+    'date_taken_oldest': ("COALESCE(date_taken, uploaded_date, '')", 'ASC'),
+    'filename_asc': ("COALESCE(filename, '')", 'ASC'),
+    'filename_desc': ("COALESCE(filename, '')", 'DESC'),
+}
+
+def encode_cursor(row):
+    return f"{row['cursor_rowid']}:{row['cursor_key']}"
+
+def decode_cursor(cursor):
+    """Return (key, rowid) for a cursor, or None if it was not made by encode_cursor."""
+    rowid, _, key = cursor.partition(':')
+    try:
+        return key, int(rowid)
+    except ValueError:
+        return None
+
+def fts_prefix_query(search_query):
+    # Each word becomes a quoted prefix term, so "beach 19" matches "Beach trip 1987"
+    return ' '.join('"' + word.replace('"', '""') + '"*' for word in search_query.split())
+
+def get_gallery_items(status, search_query, sort_by, after=None, before=None):
+    """Return one keyset page of a status gallery: (items, pagination)."""
+    where = "status = ?"
     params = [status]
     if search_query:
-        query += " AND (filename LIKE ? OR ai_caption LIKE ?)"
-        params.extend([f'%{search_query}%', f'%{search_query}%'])
+        conn = get_db_connection()
+        if search_query.strip() and conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'media_fts'").fetchone():
+            # Token lookup in the FTS index instead of a leading-wildcard LIKE over every row
+            where += " AND rowid IN (SELECT rowid FROM media_fts WHERE media_fts MATCH ?)"
+            params.append(fts_prefix_query(search_query))
+        else:
+            where += " AND (filename LIKE ? OR ai_caption LIKE ?)"
+            params.extend([f'%{search_query}%', f'%{search_query}%'])
+    return get_keyset_page(where, params, sort_by, after, before)
+
+def get_keyset_page(where, params, sort_by, after=None, before=None):
+    """Return one keyset page of media matching where: (items, pagination).
+
+    after/before are cursors from a previous page's next_cursor/prev_cursor; the
+    query seeks straight to them on the index instead of counting past an offset.
+    """
+    conn = get_db_connection()
+    key, direction = GALLERY_SORT_KEYS.get(sort_by, GALLERY_SORT_KEYS['newest'])
+    query = f"SELECT *, {key} AS cursor_key, rowid AS cursor_rowid FROM media WHERE {where}"
+    params = list(params)
     
-    if sort_by == 'oldest': query += " ORDER BY uploaded_date ASC"
-    elif sort_by == 'date_taken_newest': query += " ORDER BY COALESCE(date_taken, uploaded_date) DESC"
-    elif sort_by == 'date_taken_oldest': query += " ORDER BY COALESCE(date_taken, uploaded_date) ASC"
-    elif sort_by == 'filename_asc': query += " ORDER BY filename ASC"
-    elif sort_by == 'filename_desc': query += " ORDER BY filename DESC"
-    else: query += " ORDER BY uploaded_date DESC"
+    # Paging backwards walks the same index in the opposite direction, then flips the rows
+    backwards = before is not None and after is None
+    cursor = before if backwards else after
+    position = decode_cursor(cursor) if cursor is not None else None
+    if position is None:
+        # A mangled cursor from a hand-edited URL just lands on the first page
+        backwards = False
+        cursor = None
+    if backwards:
+        direction = 'ASC' if direction == 'DESC' else 'DESC'
+    if position is not None:
+        query += f" AND ({key}, rowid) {'<' if direction == 'DESC' else '>'} (?, ?)"
+        params.extend(position)
+    query += f" ORDER BY {key} {direction}, rowid {direction} LIMIT ?"
+    params.append(ITEMS_PER_PAGE + 1)
     
     items = conn.execute(query, params).fetchall()
-    conn.close()
-    return items
+    # The extra probe row only tells us whether another page exists
+    more = len(items) > ITEMS_PER_PAGE
+    items = items[:ITEMS_PER_PAGE]
+    if backwards:
+        items.reverse()
+    pagination = {
+        'keyset': True,
+        'items': items,
+        'has_prev': more if backwards else cursor is not None,
+        'has_next': cursor is not None if backwards else more,
+        'prev_cursor': encode_cursor(items[0]) if items else None,
+        'next_cursor': encode_cursor(items[-1]) if items else None,
+    }
+    return items, pagination
+
+def get_semantic_items(status, drive_ids):
+    """Fetch semantic_search hits with the given status, best match first."""
+    conn = get_db_connection()
+    # A temp-table join keeps one cached statement instead of a fresh IN (?,?,...) per result count,
+    # and seq carries the search ranking through to ORDER BY
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS sem_hits (seq INTEGER PRIMARY KEY, drive_id TEXT NOT NULL)")
+    conn.execute("DELETE FROM sem_hits")
+    conn.executemany("INSERT INTO sem_hits (seq, drive_id) VALUES (?, ?)", enumerate(drive_ids))
+    return conn.execute('''
+        SELECT m.* FROM sem_hits s
+        JOIN media m ON m.drive_id = s.drive_id
+        WHERE m.status = ?
+        ORDER BY s.seq
+    ''', (status,)).fetchall()
 
 @app.route('/api/bulk_action', methods=['POST'])
 def bulk_action():
@@ -196,22 +369,144 @@ def bulk_action():
     status = 'approved' if action == 'approve' else 'rejected'
     reviewed_date = datetime.now().isoformat()
     conn = get_db_connection()
-    conn.executemany("UPDATE media SET status = ?, reviewed_date = ? WHERE drive_id = ?", [(status, reviewed_date, d_id) for d_id in drive_ids])
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany("UPDATE media SET status = ?, reviewed_date = ? WHERE drive_id = ?", ((status, reviewed_date, d_id) for d_id in drive_ids))
     conn.commit()
-    conn.close()
     return jsonify({"status": "success", "count": len(drive_ids)})
 
-@app.route('/thumbnail/<drive_id>')
-def get_thumbnail(drive_id):
-    service = get_drive_service()
-    request_obj = service.files().get_media(fileId=drive_id)
-    file_stream = io.BytesIO()
-    downloader = MediaIoBaseDownload(file_stream, request_obj)
+def iter_drive_media(drive_id, chunk_size=DRIVE_CHUNK_SIZE):
+    # Hand each Drive chunk to the client and reuse the buffer, so memory stays O(chunk)
+    request_obj = get_drive_service().files().get_media(fileId=drive_id)
+    buffer = io.BytesIO()
+    downloader = MediaIoBaseDownload(buffer, request_obj, chunksize=chunk_size)
     done = False
     while done is False:
         status, done = downloader.next_chunk()
-    file_stream.seek(0)
-    return send_file(file_stream, mimetype='image/jpeg')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def with_thumbnail_caching(resp, drive_id):
+    resp.headers['Cache-Control'] = THUMBNAIL_CACHE_CONTROL
+    resp.set_etag(drive_id)
+    return resp
+
+@app.route('/thumbnail/<drive_id>')
+def get_thumbnail(drive_id):
+    # A revalidation can skip the download entirely
+    if drive_id in request.if_none_match:
+        return with_thumbnail_caching(make_response('', 304), drive_id)
+    chunks = iter_drive_media(drive_id)
+    # Pull the first chunk now so a Drive error fails the request before any headers go out
+    first_chunk = next(chunks)
+    return with_thumbnail_caching(Response(itertools.chain([first_chunk], chunks), mimetype='image/jpeg'), drive_id)
+
+def ensure_indexes():
+    conn = sqlite3.connect(DB_PATH)
+    conn.executescript('''
+        CREATE INDEX IF NOT EXISTS idx_media_status ON media(status);
+        CREATE INDEX IF NOT EXISTS idx_media_drive_id ON media(drive_id);
+        CREATE INDEX IF NOT EXISTS idx_media_uploaded_date ON media(uploaded_date DESC);
+        -- One per GALLERY_SORT_KEYS expression so keyset pages are a range seek on the index
+        CREATE INDEX IF NOT EXISTS idx_media_status_uploaded_key ON media(status, COALESCE(uploaded_date, ''));
+        CREATE INDEX IF NOT EXISTS idx_media_status_date_taken_key ON media(status, COALESCE(date_taken, uploaded_date, ''));
+        CREATE INDEX IF NOT EXISTS idx_media_status_filename_key ON media(status, COALESCE(filename, ''));
+    ''')
+    try:
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_faces_cluster_drive ON faces(cluster_id, drive_id)')
+    except sqlite3.OperationalError:
+        pass  # faces only exists once the face worker has run
+    conn.close()
+
+def ensure_media_fts():
+    conn = sqlite3.connect(DB_PATH)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'media_fts'").fetchone():
+        conn.close()
+        return
+    try:
+        conn.execute("CREATE VIRTUAL TABLE media_fts USING fts5(filename, ai_caption, content='media', content_rowid='rowid')")
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5; get_gallery_items keeps the LIKE scan
+        conn.close()
+        return
+    # External-content index, kept in step with whatever the workers write
+    conn.executescript('''
+        CREATE TRIGGER IF NOT EXISTS trg_media_fts_insert AFTER INSERT ON media BEGIN
+            INSERT INTO media_fts(rowid, filename, ai_caption) VALUES (NEW.rowid, NEW.filename, NEW.ai_caption);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_media_fts_delete AFTER DELETE ON media BEGIN
+            INSERT INTO media_fts(media_fts, rowid, filename, ai_caption) VALUES ('delete', OLD.rowid, OLD.filename, OLD.ai_caption);
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_media_fts_update AFTER UPDATE OF filename, ai_caption ON media BEGIN
+            INSERT INTO media_fts(media_fts, rowid, filename, ai_caption) VALUES ('delete', OLD.rowid, OLD.filename, OLD.ai_caption);
+            INSERT INTO media_fts(rowid, filename, ai_caption) VALUES (NEW.rowid, NEW.filename, NEW.ai_caption);
+        END;
+        INSERT INTO media_fts(media_fts) VALUES ('rebuild');
+    ''')
+    conn.close()
+
+def ensure_media_version():
+    conn = sqlite3.connect(DB_PATH)
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS media_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO media_version (id, version) VALUES (1, 0);
+        CREATE TRIGGER IF NOT EXISTS trg_media_version_insert AFTER INSERT ON media BEGIN
+            UPDATE media_version SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_media_version_update AFTER UPDATE ON media BEGIN
+            UPDATE media_version SET version = version + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_media_version_delete AFTER DELETE ON media BEGIN
+            UPDATE media_version SET version = version + 1;
+        END;
+    ''')
+    conn.close()
+
+def ensure_people_version():
+    conn = sqlite3.connect(DB_PATH)
+    tables = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('faces', 'clusters')")}
+    # Without both triggers a person page could go stale, so leave it uncached until the face worker has run
+    if tables == {'faces', 'clusters'}:
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS people_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO people_version (id, version) VALUES (1, 0);
+            CREATE TRIGGER IF NOT EXISTS trg_people_version_faces_insert AFTER INSERT ON faces BEGIN
+                UPDATE people_version SET version = version + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_people_version_faces_update AFTER UPDATE ON faces BEGIN
+                UPDATE people_version SET version = version + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_people_version_faces_delete AFTER DELETE ON faces BEGIN
+                UPDATE people_version SET version = version + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_people_version_clusters_insert AFTER INSERT ON clusters BEGIN
+                UPDATE people_version SET version = version + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_people_version_clusters_update AFTER UPDATE ON clusters BEGIN
+                UPDATE people_version SET version = version + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_people_version_clusters_delete AFTER DELETE ON clusters BEGIN
+                UPDATE people_version SET version = version + 1;
+            END;
+        ''')
+    conn.close()
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    ensure_indexes()
+    ensure_media_fts()
+    ensure_media_version()
+    ensure_people_version()
+    try:
+        # waitress runs on Windows (unlike gunicorn) and serves requests from a thread pool
+        from waitress import serve
+    except ImportError:
+        app.run(debug=True, port=5000, threaded=True)
+    else:
+        serve(app, host='127.0.0.1', port=5000, threads=SERVER_THREADS)
@@ -1,18 +1,130 @@
 import sqlite3
-import imagehash
 from PIL import Image
 import io
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
+try:
+    import numpy as np
+    from numba import njit, prange
+except ImportError:  # numba is optional; the BK-tree below needs neither
+    njit = None
 
 DB_PATH = r'F:\FamilyArchive\data\archive.db'
 SERVICE_ACCOUNT_FILE = r'F:\FamilyArchive\config\service-account.json'
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+# phash_u64 holds the hash bits as a signed SQLite INTEGER; masking recovers the unsigned value
+UINT64_MASK = (1 << 64) - 1
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit pHash integers with Hamming distance.
+    
+    Each child edge is labelled with its distance to the parent, so by the triangle
+    inequality a radius search only descends into edges within [d - radius, d + radius].
+    """
+    
+    def __init__(self):
+        self.root = None
+    
+    def add(self, hash_int, index):
+        node = [hash_int, index, {}]
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = (current[0] ^ hash_int).bit_count()
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+    
+    def find(self, hash_int, radius):
+        """Return the indexes of every stored hash within radius of hash_int."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_hash, index, children = stack.pop()
+            distance = (node_hash ^ hash_int).bit_count()
+            if distance <= radius:
+                found.append(index)
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return found
 
 def get_drive_service():
     creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    return build('drive', 'v3', credentials=creds)
+    return build('drive', 'v3', credentials=creds, cache_discovery=False)
+
+if njit is not None:
+    # SWAR popcount on uint64: every operand is uint64 so numba never widens to float,
+    # and LLVM folds the sequence into a single popcnt where the CPU has one
+    _M1 = np.uint64(0x5555555555555555)
+    _M2 = np.uint64(0x3333333333333333)
+    _M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+    _H01 = np.uint64(0x0101010101010101)
+    _ONE, _TWO, _FOUR, _FIFTY_SIX = np.uint64(1), np.uint64(2), np.uint64(4), np.uint64(56)
+    
+    @njit(cache=True)
+    def _popcount64(x):
+        x = x - ((x >> _ONE) & _M1)
+        x = (x & _M2) + ((x >> _TWO) & _M2)
+        x = (x + (x >> _FOUR)) & _M4
+        return (x * _H01) >> _FIFTY_SIX
+    
+    # Two passes (count, then fill) so parallel rows write disjoint slices with no shared list
+    @njit(parallel=True, cache=True)
+    def _count_close(hashes, threshold):
+        counts = np.zeros(len(hashes), dtype=np.int64)
+        for i in prange(len(hashes)):
+            found = 0
+            for j in range(i + 1, len(hashes)):
+                if _popcount64(hashes[i] ^ hashes[j]) <= threshold:
+                    found += 1
+            counts[i] = found
+        return counts
+    
+    @njit(parallel=True, cache=True)
+    def _fill_close(hashes, threshold, offsets, left, right):
+        for i in prange(len(hashes)):
+            k = offsets[i]
+            for j in range(i + 1, len(hashes)):
+                if _popcount64(hashes[i] ^ hashes[j]) <= threshold:
+                    left[k] = i
+                    right[k] = j
+                    k += 1
+    
+    def find_close_pairs(hashes, threshold):
+        """Return index arrays (left, right), left < right, of every pair within threshold bits."""
+        threshold = np.uint64(threshold)
+        counts = _count_close(hashes, threshold)
+        offsets = np.zeros(len(hashes) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        left = np.empty(offsets[-1], dtype=np.int64)
+        right = np.empty(offsets[-1], dtype=np.int64)
+        _fill_close(hashes, threshold, offsets, left, right)
+        return left, right
+else:
+    find_close_pairs = None
+
+def hamming_neighbours(hash_ints, threshold):
+    """Return a function mapping an index to the indexes of every other hash within threshold."""
+    if find_close_pairs is not None and hash_ints:
+        # Exhaustive compiled scan: ~N^2/2 branch-free XOR+popcounts spread across cores
+        left, right = find_close_pairs(np.array(hash_ints, dtype=np.uint64), threshold)
+        adjacency = [[] for _ in hash_ints]
+        for i, j in zip(left.tolist(), right.tolist()):
+            adjacency[i].append(j)
+            adjacency[j].append(i)
+        return adjacency.__getitem__
+    
+    tree = BKTree()
+    for index, hash_int in enumerate(hash_ints):
+        tree.add(hash_int, index)
+    return lambda i: [j for j in tree.find(hash_ints[i], threshold) if j != i]
 
 def find_duplicates(threshold=5):
     """
@@ -28,49 +140,118 @@ def find_duplicates(threshold=5):
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
-    # Get all items with pHash values
-    items = cursor.execute('''
-        SELECT drive_id, phash FROM media 
+    # Get all items with pHash values; phash_u64 (see fix_schema.py) saves re-parsing the hex
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(media)")}
+    int_column = "phash_u64" if "phash_u64" in columns else "NULL"
+    items = cursor.execute(f'''
+        SELECT drive_id, {int_column}, phash FROM media 
         WHERE phash IS NOT NULL AND phash != 'failed'
     ''').fetchall()
     
     conn.close()
     
-    # Build hash objects
-    hash_objects = []
-    for drive_id, phash_str in items:
+    # Collect each 64-bit pHash, parsing hex only for rows not yet backfilled
+    drive_ids = []
+    hash_ints = []
+    for drive_id, phash_int, phash_str in items:
         try:
-            hash_obj = imagehash.ImageHash(imagehash.hex2np(phash_str))
-            hash_objects.append((drive_id, hash_obj))
+            if phash_int is not None:
+                hash_int = phash_int & UINT64_MASK
+            else:
+                hash_int = int(phash_str, 16)
+                if hash_int >> 64:
+                    raise ValueError(f"expected a 64-bit hash, got {phash_str!r}")
         except Exception as e:
             print(f"Error parsing hash for {drive_id}: {e}")
+            continue
+        drive_ids.append(drive_id)
+        hash_ints.append(hash_int)
     
-    # Find duplicates using Hamming distance
+    # Find duplicates using Hamming distance.
+    # An unseen earlier item already failed to match this one, so no ordering filter is needed.
+    neighbours = hamming_neighbours(hash_ints, threshold)
     duplicates = []
     seen = set()
     
-    for i, (drive_id_1, hash_1) in enumerate(hash_objects):
-        if drive_id_1 in seen:
+    for i in range(len(hash_ints)):
+        if i in seen:
             continue
         
-        group = [drive_id_1]
-        for drive_id_2, hash_2 in hash_objects[i+1:]:
-            if drive_id_2 in seen:
-                continue
-            
-            # Calculate Hamming distance
-            distance = hash_1 - hash_2
-            if distance <= threshold:
-                group.append(drive_id_2)
-                seen.add(drive_id_2)
+        matches = sorted(j for j in neighbours(i) if j not in seen)
         
-        if len(group) > 1:
-            duplicates.append(group)
-            for drive_id in group:
-                seen.add(drive_id)
+        if matches:
+            duplicates.append([drive_ids[i]] + [drive_ids[j] for j in matches])
+            seen.add(i)
+            seen.update(matches)
     
     return duplicates
 
+def ensure_duplicate_groups_schema(conn):
+    """
+    Create the duplicate_groups table that caches find_duplicates() results.
+    
+    A pHash change on any member drops that item's row, so the cache never
+    shows a stale match; refresh_duplicate_groups() re-adds it on the next run.
+    """
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS duplicate_groups (
+            group_id INTEGER NOT NULL,
+            drive_id TEXT NOT NULL,
+            PRIMARY KEY (group_id, drive_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_duplicate_groups_drive_id ON duplicate_groups(drive_id);
+        CREATE TRIGGER IF NOT EXISTS trg_duplicate_groups_phash_insert AFTER INSERT ON media BEGIN
+            DELETE FROM duplicate_groups WHERE drive_id = NEW.drive_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_duplicate_groups_phash_update AFTER UPDATE OF phash ON media BEGIN
+            DELETE FROM duplicate_groups WHERE drive_id = NEW.drive_id;
+        END;
+    ''')
+
+def refresh_duplicate_groups(threshold=5):
+    """
+    Recompute duplicate groups and replace the cached duplicate_groups rows.
+    
+    Returns:
+        int: Number of duplicate groups stored.
+    """
+    duplicate_groups = find_duplicates(threshold=threshold)
+    
+    conn = sqlite3.connect(DB_PATH)
+    ensure_duplicate_groups_schema(conn)
+    with conn:
+        conn.execute("DELETE FROM duplicate_groups")
+        conn.executemany(
+            "INSERT INTO duplicate_groups (group_id, drive_id) VALUES (?, ?)",
+            ((group_id, drive_id) for group_id, group in enumerate(duplicate_groups, 1) for drive_id in group)
+        )
+    conn.close()
+    return len(duplicate_groups)
+
+def load_duplicate_groups(conn):
+    """
+    Read cached duplicate groups with metadata for the dashboard.
+    
+    Groups left with a single item after invalidation are skipped. Raises
+    sqlite3.OperationalError if refresh_duplicate_groups() has never run.
+    """
+    rows = conn.execute('''
+        SELECT m.*, dg.group_id
+        FROM duplicate_groups dg
+        JOIN media m USING (drive_id)
+        WHERE dg.group_id IN (SELECT group_id FROM duplicate_groups GROUP BY group_id HAVING COUNT(*) > 1)
+        ORDER BY dg.group_id
+    ''').fetchall()
+    
+    result = []
+    current_group_id = None
+    for row in rows:
+        if row['group_id'] != current_group_id:
+            current_group_id = row['group_id']
+            result.append([])
+        result[-1].append(dict(row))
+    return result
+
 def get_duplicate_groups():
     """
     Get duplicate groups with metadata for the dashboard.
@@ -81,18 +262,23 @@ def get_duplicate_groups():
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
+    # One query for every group: stage the ids in a temp table (no 999-parameter limit)
+    # and regroup in Python, instead of a SELECT per group
+    cursor.execute("CREATE TEMP TABLE dup_ids (drive_id TEXT PRIMARY KEY)")
+    cursor.executemany("INSERT OR IGNORE INTO dup_ids (drive_id) VALUES (?)", ((d,) for group in duplicate_groups for d in group))
+    items = cursor.execute("SELECT m.* FROM media m JOIN dup_ids USING (drive_id)").fetchall()
+    by_drive_id = {item['drive_id']: dict(item) for item in items}
+    
     result = []
     for group in duplicate_groups:
-        group_data = []
-        placeholders = ','.join(['?' for _ in group])
-        items = cursor.execute(f"SELECT * FROM media WHERE drive_id IN ({placeholders})", group).fetchall()
-        group_data = [dict(item) for item in items]
+        group_data = [by_drive_id[d] for d in group if d in by_drive_id]
         result.append(group_data)
     
     conn.close()
     return result
 
 if __name__ == "__main__":
+    print(f"Stored {refresh_duplicate_groups()} duplicate groups")
     groups = get_duplicate_groups()
     print(f"Found {len(groups)} duplicate groups")
     for i, group in enumerate(groups):
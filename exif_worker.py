@@ -7,15 +7,21 @@ from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 from PIL import Image
 from PIL.ExifTags import TAGS
+try:
+    import piexif
+except ImportError:  # fall back to PIL for everything
+    piexif = None
 
 # --- CONFIGURATION ---
 DB_PATH = r'F:\FamilyArchive\data\archive.db'
 SERVICE_ACCOUNT_FILE = r'F:\FamilyArchive\config\service-account.json'
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+# EXIF lives in the APP1 segment right after the JPEG header, so the first 128 KB almost always holds it
+EXIF_PROBE_BYTES = 128 * 1024
 
 def get_drive_service():
     creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    return build('drive', 'v3', credentials=creds)
+    return build('drive', 'v3', credentials=creds, cache_discovery=False)
 
 def get_db_connection():
     return sqlite3.connect(DB_PATH)
@@ -48,7 +54,38 @@ def update_schema():
     conn.commit()
     conn.close()
 
+def get_exif_fields(image_bytes):
+    """
+    Read just the tags process_pending_exif uses, straight from the EXIF segment.
+    
+    piexif parses the APP1 block without opening an image decoder or walking the
+    whole TAGS table. Returns None when piexif can't read the file (e.g. PNG), so
+    the caller can fall back to PIL.
+    """
+    if piexif is None:
+        return None
+    try:
+        exif = piexif.load(image_bytes)
+    except Exception:
+        return None
+    
+    wanted = (
+        ('Make', '0th', piexif.ImageIFD.Make),
+        ('Model', '0th', piexif.ImageIFD.Model),
+        ('DateTime', '0th', piexif.ImageIFD.DateTime),
+        ('DateTimeOriginal', 'Exif', piexif.ExifIFD.DateTimeOriginal),
+    )
+    data = {}
+    for name, ifd, tag in wanted:
+        value = exif.get(ifd, {}).get(tag)
+        if value is not None:
+            data[name] = value.decode('ascii', 'replace').rstrip('\x00') if isinstance(value, bytes) else value
+    return data
+
 def get_exif_data(image_bytes):
+    fields = get_exif_fields(image_bytes)
+    if fields is not None:
+        return fields
     try:
         img = Image.open(io.BytesIO(image_bytes))
         exif = img._getexif()
@@ -64,6 +101,21 @@ def get_exif_data(image_bytes):
         print(f"Error extracting EXIF: {e}")
         return {}
 
+def download_head(service, drive_id, size=EXIF_PROBE_BYTES):
+    # Ranged GET: Drive answers 206 with just the leading bytes instead of the whole file
+    request = service.files().get_media(fileId=drive_id)
+    request.headers['Range'] = f'bytes=0-{size - 1}'
+    return request.execute()
+
+def download_file(service, drive_id):
+    request = service.files().get_media(fileId=drive_id)
+    file_stream = io.BytesIO()
+    downloader = MediaIoBaseDownload(file_stream, request)
+    done = False
+    while done is False:
+        status, done = downloader.next_chunk()
+    return file_stream.getvalue()
+
 def format_date(date_str):
     if not date_str:
         return None
@@ -89,16 +141,11 @@ def process_pending_exif():
         
         try:
             # Download small chunk for EXIF (usually at the start of the file)
-            # For simplicity, we download the whole file here, but in production, 
-            # a range request for the first 128KB is often enough for EXIF.
-            request = service.files().get_media(fileId=drive_id)
-            file_stream = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_stream, request)
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-            
-            exif = get_exif_data(file_stream.getvalue())
+            head = download_head(service, drive_id)
+            exif = get_exif_data(head)
+            if not exif and len(head) >= EXIF_PROBE_BYTES:
+                # EXIF may sit past the probe (e.g. a large embedded preview); fetch the rest
+                exif = get_exif_data(download_file(service, drive_id))
             
             # Extract specific fields
             date_taken = format_date(exif.get('DateTimeOriginal') or exif.get('DateTime'))
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import numpy as np
+import hnswlib
+from functools import lru_cache
+
+# --- CONFIGURATION ---
+DB_PATH = r'F:\FamilyArchive\data\archive.db'
+FACE_INDEX_PATH = r'F:\FamilyArchive\data\faces.hnsw'
+# buffalo_l's ArcFace head emits 512-d embeddings
+FACE_EMBEDDING_DIM = 512
+# HNSW build/search parameters; higher = better recall, slower build/query
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+def get_db_connection():
+    return sqlite3.connect(DB_PATH)
+
+def decode_embedding(blob, emb_dtype):
+    # face_worker stores float16 now; older rows are float32
+    return np.frombuffer(blob, dtype=emb_dtype or 'float32').astype(np.float32)
+
+def build_face_index():
+    """
+    Rebuild the HNSW index over every face embedding and save it next to the database.
+    
+    Labels are faces.id, so query results map straight back to rows in the faces table.
+    
+    Returns:
+        int: Number of faces indexed.
+    """
+    conn = get_db_connection()
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(faces)")}
+    dtype_column = "emb_dtype" if "emb_dtype" in columns else "NULL"
+    rows = conn.execute(f"SELECT id, embedding, {dtype_column} FROM faces WHERE embedding IS NOT NULL").fetchall()
+    conn.close()
+    
+    if not rows:
+        return 0
+    
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    embeddings = np.vstack([decode_embedding(row[1], row[2]) for row in rows])
+    
+    index = hnswlib.Index(space='cosine', dim=FACE_EMBEDDING_DIM)
+    index.init_index(max_elements=len(ids), ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+    index.add_items(embeddings, ids)
+    
+    # Write then swap, so a reader never loads a half-written index
+    tmp_path = f"{FACE_INDEX_PATH}.tmp"
+    index.save_index(tmp_path)
+    os.replace(tmp_path, FACE_INDEX_PATH)
+    return len(ids)
+
+# Keyed on mtime so a rebuilt index is picked up without a restart
+@lru_cache(maxsize=1)
+def _load_face_index(path, mtime):
+    index = hnswlib.Index(space='cosine', dim=FACE_EMBEDDING_DIM)
+    index.load_index(path)
+    index.set_ef(HNSW_EF_SEARCH)
+    return index
+
+def load_face_index():
+    return _load_face_index(FACE_INDEX_PATH, os.path.getmtime(FACE_INDEX_PATH))
+
+def find_similar_faces(embedding, k=20):
+    """
+    Find the faces nearest to an embedding.
+    
+    Args:
+        embedding (np.ndarray): Query face embedding (any float dtype).
+        k (int): Number of neighbours to return.
+    
+    Returns:
+        list: List of (face_id, cosine_distance) tuples, nearest first.
+    """
+    index = load_face_index()
+    k = min(k, index.get_current_count())
+    if k == 0:
+        return []
+    labels, distances = index.knn_query(np.asarray(embedding, dtype=np.float32), k=k)
+    return [(int(face_id), float(distance)) for face_id, distance in zip(labels[0], distances[0])]
+
+if __name__ == "__main__":
+    print(f"Indexed {build_face_index()} faces into {FACE_INDEX_PATH}")
@@ -1,6 +1,9 @@
 import os
 import sqlite3
 import io
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from datetime import datetime
 from google.oauth2 import service_account
@@ -9,19 +12,113 @@ from googleapiclient.http import MediaIoBaseDownload
 from PIL import Image
 import cv2
 import insightface
+import onnxruntime
 from insightface.app import FaceAnalysis
+try:
+    from face_index import build_face_index
+except ImportError:  # hnswlib not installed; faces are still stored, just not indexed
+    build_face_index = None
+try:
+    from turbojpeg import TurboJPEG
+    turbo_jpeg = TurboJPEG()
+except (ImportError, RuntimeError, OSError):  # package or libjpeg-turbo missing; decode with OpenCV
+    turbo_jpeg = None
 
 # --- CONFIGURATION ---
 DB_PATH = r'F:\FamilyArchive\data\archive.db'
 SERVICE_ACCOUNT_FILE = r'F:\FamilyArchive\config\service-account.json'
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+# Images per transaction; one commit (and fsync) per image dominated the insert cost
+COMMIT_EVERY = 100
+# Drive downloads run in a thread pool while the model works on already-fetched images
+DOWNLOAD_WORKERS = 8
+PREFETCH_IMAGES = 32
+# Clustering is cosine-based and tolerates half precision; halves the size of every faces.embedding blob
+EMBEDDING_DTYPE = 'float16'
+# The detector letterboxes to det_size anyway, so JPEGs are decoded no larger than needed for it
+DETECTION_SIZE = 640
+EXIF_ORIENTATION = 0x0112
 
 def get_drive_service():
     creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    return build('drive', 'v3', credentials=creds)
+    return build('drive', 'v3', credentials=creds, cache_discovery=False)
+
+_drive_local = threading.local()
+
+def get_thread_drive_service():
+    # httplib2 is not thread-safe, so each download thread builds its own client once
+    service = getattr(_drive_local, 'service', None)
+    if service is None:
+        service = _drive_local.service = get_drive_service()
+    return service
+
+def download_image(drive_id):
+    request = get_thread_drive_service().files().get_media(fileId=drive_id)
+    file_stream = io.BytesIO()
+    downloader = MediaIoBaseDownload(file_stream, request)
+    done = False
+    while done is False:
+        status, done = downloader.next_chunk()
+    
+    # Decode here too; both decoders release the GIL
+    return decode_image(file_stream.getvalue())
+
+def jpeg_orientation(data):
+    """Return the EXIF orientation of JPEG bytes (1 when absent); Image.open only parses the headers."""
+    try:
+        return Image.open(io.BytesIO(data)).getexif().get(EXIF_ORIENTATION, 1)
+    except OSError:
+        return 1
+
+def decode_image(data):
+    """
+    Decode image bytes to a BGR array for InsightFace.
+    
+    JPEGs are scaled by 1/2, 1/4 or 1/8 inside libjpeg-turbo's DCT, picking the
+    smallest scale that keeps the long side at least DETECTION_SIZE, so most of a
+    large photo is never decoded. Returns (img, scale); multiply coordinates found
+    in img by scale to map them back to the original image.
+
+    libjpeg-turbo ignores the EXIF orientation tag, so rotated photos go through
+    OpenCV, which applies it, to keep faces upright for the detector.
+    """
+    if turbo_jpeg is not None and data[:2] == b'\xff\xd8' and jpeg_orientation(data) == 1:
+        try:
+            width, height, _, _ = turbo_jpeg.decode_header(data)
+            denominator = 1
+            while denominator < 8 and max(width, height) // (denominator * 2) >= DETECTION_SIZE:
+                denominator *= 2
+            return turbo_jpeg.decode(data, scaling_factor=(1, denominator)), denominator
+        except OSError:
+            pass  # let OpenCV have a go at anything libjpeg-turbo rejects
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), 1
+
+def prefetch_images(items):
+    """Yield (drive_id, filename, future) in order, keeping up to PREFETCH_IMAGES downloads in flight."""
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        in_flight = deque()
+        for drive_id, filename in items:
+            in_flight.append((drive_id, filename, executor.submit(download_image, drive_id)))
+            if len(in_flight) >= PREFETCH_IMAGES:
+                yield in_flight.popleft()
+        while in_flight:
+            yield in_flight.popleft()
+
+def get_face_providers():
+    """Return (providers, provider_options, ctx_id) for FaceAnalysis, preferring CUDA when present."""
+    if 'CUDAExecutionProvider' in onnxruntime.get_available_providers():
+        return (
+            ['CUDAExecutionProvider', 'CPUExecutionProvider'],
+            [{'device_id': 0, 'arena_extend_strategy': 'kNextPowerOfTwo'}, {}],
+            0,
+        )
+    return ['CPUExecutionProvider'], [{}], -1
 
 def get_db_connection():
-    return sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
 
 def update_schema():
     conn = get_db_connection()
@@ -36,10 +133,18 @@ def update_schema():
             bbox TEXT,
             confidence REAL,
             cluster_id INTEGER,
+            emb_dtype TEXT DEFAULT 'float32',
             FOREIGN KEY (drive_id) REFERENCES media (drive_id)
         )
     ''')
     
+    # Rows written before embeddings were stored as float16 keep the float32 default
+    try:
+        cursor.execute("ALTER TABLE faces ADD COLUMN emb_dtype TEXT DEFAULT 'float32'")
+    except sqlite3.OperationalError:
+        # Column already exists
+        pass
+    
     # Table for storing named clusters (people)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS clusters (
@@ -55,10 +160,11 @@ def update_schema():
 def process_faces():
     # 1. Load InsightFace (Load-Process-Unload pattern)
     print("Loading InsightFace model...")
-    app = FaceAnalysis(name='buffalo_l', providers=['CPUExecutionProvider']) # Use CPU for sandbox, user can switch to CUDA
-    app.prepare(ctx_id=0, det_size=(640, 640))
+    providers, provider_options, ctx_id = get_face_providers()
+    print(f"Using {providers[0]}")
+    app = FaceAnalysis(name='buffalo_l', providers=providers, provider_options=provider_options)
+    app.prepare(ctx_id=ctx_id, det_size=(DETECTION_SIZE, DETECTION_SIZE))
     
-    service = get_drive_service()
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -72,21 +178,12 @@ def process_faces():
     
     print(f"Found {len(items)} items to process for faces.")
     
-    for drive_id, filename in items:
+    # The model stays on this thread; only download + decode are handed to the pool
+    for processed, (drive_id, filename, download) in enumerate(prefetch_images(items), 1):
         print(f"Processing {filename} for faces...")
         
         try:
-            # Download image
-            request = service.files().get_media(fileId=drive_id)
-            file_stream = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_stream, request)
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-            
-            # Convert to OpenCV format
-            file_bytes = np.frombuffer(file_stream.getvalue(), np.uint8)
-            img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+            img, scale = download.result()
             
             if img is None:
                 print(f"Could not decode {filename}")
@@ -96,23 +193,29 @@ def process_faces():
             faces = app.get(img)
             print(f"Detected {len(faces)} faces in {filename}")
             
-            for face in faces:
-                # Store embedding as blob
-                embedding = face.embedding.tobytes()
-                bbox = json.dumps(face.bbox.tolist())
-                confidence = float(face.det_score)
-                
-                cursor.execute('''
-                    INSERT INTO faces (drive_id, embedding, bbox, confidence)
-                    VALUES (?, ?, ?, ?)
-                ''', (drive_id, embedding, bbox, confidence))
-            
-            conn.commit()
+            # Store embeddings as blobs, one statement for all faces in the image
+            cursor.executemany('''
+                INSERT INTO faces (drive_id, embedding, bbox, confidence, emb_dtype)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [
+                # bboxes are stored in original-image pixels, whatever scale the image was decoded at
+                (drive_id, face.embedding.astype(EMBEDDING_DTYPE).tobytes(), json.dumps((face.bbox * scale).tolist()), float(face.det_score), EMBEDDING_DTYPE)
+                for face in faces
+            ])
             
         except Exception as e:
             print(f"Failed to process {filename}: {e}")
+        
+        if processed % COMMIT_EVERY == 0:
+            conn.commit()
 
+    conn.commit()
     conn.close()
+    
+    # Rebuild the nearest-neighbour index so lookups see the new faces without a linear scan
+    if build_face_index is not None and items:
+        print(f"Indexed {build_face_index()} faces for similarity search.")
+    
     print("Face processing complete. Unloading model...")
     # In Python, the model will be garbage collected when 'app' goes out of scope.
     # We can explicitly delete it to be sure.
@@ -2,6 +2,16 @@ import sqlite3
 
 DB_PATH = r'F:\FamilyArchive\data\archive.db'
 
+def phash_to_int64(phash_str):
+    # SQLite INTEGER is signed, so the 64 hash bits are stored two's-complement
+    try:
+        value = int(phash_str, 16)
+    except (TypeError, ValueError):
+        return None
+    if value >> 64:
+        return None
+    return value - (1 << 64) if value >> 63 else value
+
 def fix_schema():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
@@ -11,6 +21,7 @@ def fix_schema():
         ('ai_caption', 'TEXT'),
         ('clip_embedding', 'BLOB'),
         ('phash', 'TEXT'),
+        ('phash_u64', 'INTEGER'),
         ('date_taken', 'TEXT'),
         ('camera_make', 'TEXT'),
         ('camera_model', 'TEXT')
@@ -22,6 +33,34 @@ def fix_schema():
             print(f"Added column: {col_name}")
         except sqlite3.OperationalError:
             print(f"Column already exists: {col_name}")
+    
+    # Parse each stored hex pHash once so duplicate detection can read plain integers
+    conn.create_function('phash_to_int64', 1, phash_to_int64, deterministic=True)
+    cursor.execute('''
+        UPDATE media SET phash_u64 = phash_to_int64(phash)
+        WHERE phash_u64 IS NULL AND phash IS NOT NULL AND phash != 'failed'
+    ''')
+    print(f"Backfilled phash_u64 for {cursor.rowcount} rows")
+    
+    # Indexes behind the gallery filters/sorts and the person_gallery join
+    required_indexes = [
+        ('idx_media_status_uploaded', 'media(status, uploaded_date DESC)'),
+        ('idx_media_status_date_taken', 'media(status, COALESCE(date_taken, uploaded_date))'),
+        ('idx_media_status_filename', 'media(status, filename)'),
+        ('idx_faces_drive', 'faces(drive_id)'),
+        ('idx_faces_cluster', 'faces(cluster_id)'),
+    ]
+    
+    for index_name, target in required_indexes:
+        try:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {target}")
+            print(f"Index ready: {index_name}")
+        except sqlite3.OperationalError as e:
+            # faces only exists once the face worker has run
+            print(f"Skipped index {index_name}: {e}")
+    
+    # WAL is persistent, so readers stop blocking behind writers for every later connection too
+    cursor.execute("PRAGMA journal_mode=WAL")
             
     conn.commit()
     conn.close()
@@ -1,26 +1,46 @@
+import asyncio
+import functools
 import json
+import logging
 import os
 import re
 import secrets
 import smtplib
 import sqlite3
+import threading
 import time
 import hashlib
+import hmac
+import itertools
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from pydantic import BaseModel, ConfigDict
 import boto3
 from botocore.config import Config
+from cachetools import TTLCache
 import uuid
+try:
+    import orjson
+except ImportError:  # orjson is optional; responses fall back to stdlib json
+    orjson = None
 
-app = FastAPI()
+# orjson encodes the JSON bodies every upload and dashboard call returns several times faster
+APIResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+app = FastAPI(default_response_class=APIResponse)
+
+# Upload routes log through here with %-style arguments, so per-chunk DEBUG lines cost
+# nothing unless LOG_LEVEL=DEBUG
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(message)s")
+logger = logging.getLogger("intake")
 
 BASE_DIR = Path(__file__).parent
 TEMPLATES = Jinja2Templates(directory=str(BASE_DIR / "templates"))
@@ -50,16 +70,74 @@ SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 SMTP_FROM = os.getenv("SMTP_FROM", "Family Archive <noreply@familyarchive.local>")
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8080")  # For verification links
 
-_RATE_LIMIT = {}
-_UPLOAD_SESSIONS = {}  # Track multipart uploads
-_URL_CACHE = {}  # Cache presigned URLs to avoid rate limiting
+# Request timestamps per IP; an idle IP's entry expires with the window instead of living forever
+_RATE_LIMIT = TTLCache(maxsize=10000, ttl=60)
+# Batch ids: process-start stamp + pid keep workers and restarts apart, the counter keeps
+# batches within a process apart (two created in the same second used to collide)
+_BATCH_PREFIX = f"batch_{time.strftime('%Y%m%d_%H%M%S', time.gmtime())}_{os.getpid():x}"
+_BATCH_COUNTER = itertools.count()
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+UPLOAD_REAPER_INTERVAL_SECONDS = 600  # How often abandoned upload sessions are swept
+R2_PART_SIZE = 5 * 1024 * 1024  # Matches the uploader's chunk size; R2's minimum part size
+_PART_BUFFERS = []  # Recycled R2_PART_SIZE bodies, so each chunk doesn't allocate (and free) 5MB
+_PART_BUFFER_POOL_SIZE = 32
 _URL_CACHE_TTL = 3000  # Cache URLs for 50 minutes (they expire in 60)
+_URL_CACHE = TTLCache(maxsize=5000, ttl=_URL_CACHE_TTL)  # Cache presigned URLs to avoid rate limiting
+_CONTRIBUTOR_CACHE_TTL = 300  # Picks up manual edits to contributors within 5 minutes
+# Cache token lookups so every upload call doesn't open the database. Lookups run in
+# FastAPI's threadpool and TTLCache isn't thread-safe, hence the lock.
+_CONTRIBUTOR_CACHE = TTLCache(maxsize=1000, ttl=_CONTRIBUTOR_CACHE_TTL)
+_CONTRIBUTOR_CACHE_LOCK = threading.Lock()
+
+
+# --- Request Models ---
+# Typed bodies for the upload endpoints: pydantic-core validates these (nested file
+# lists included) in compiled code instead of the handlers poking at raw dicts.
+
+class UploadInitRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_max_length=4096)
+
+    token: str
+    batch_id: Optional[str] = None
+    filename: str
+    mime_type: Optional[str] = None
+    size_bytes: int = 0
+
+
+class UploadedFile(BaseModel):
+    # Extra keys are kept so the manifest records whatever the uploader sent
+    model_config = ConfigDict(extra="allow", str_max_length=4096)
+
+    original_name: Optional[str] = None
+    mime: Optional[str] = None
+    size: Optional[int] = None
+    object_key: Optional[str] = None
+    upload_started_at: Optional[str] = None
+    upload_finished_at: Optional[str] = None
+
+
+class BatchFinishRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_max_length=4096)
+
+    token: str
+    batch_id: Optional[str] = None
+    decade: Optional[str] = None
+    event: Optional[str] = None
+    notes: Optional[str] = None
+    files: List[UploadedFile] = []
+    total_bytes: Optional[int] = None
+    voice_note: Optional[Dict[str, Any]] = None
 
 
 # --- R2 Client Setup ---
 
+@functools.lru_cache(maxsize=1)
 def get_r2_client():
-    """Get a boto3 S3 client configured for Cloudflare R2."""
+    """Get the shared boto3 S3 client configured for Cloudflare R2.
+
+    Built once: boto3 clients are thread-safe to use, but creating them from
+    worker threads concurrently is not, and each build re-reads the service model.
+    """
     return boto3.client(
         "s3",
         endpoint_url=f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com",
@@ -72,6 +150,14 @@ def get_r2_client():
     )
 
 
+def multipart_parts(session: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Build the CompleteMultipartUpload part list, ordered by part number."""
+    return [
+        {"PartNumber": part_number, "ETag": etag}
+        for part_number, etag in sorted(session["parts"].items())
+    ]
+
+
 # --- Database Setup for Self-Registration ---
 
 def get_contributors_db():
@@ -105,6 +191,29 @@ def init_contributors_db():
             count INTEGER DEFAULT 0
         )
     ''')
+    # In-flight uploads live here rather than in process memory so every uvicorn
+    # worker sees the same sessions and a restart doesn't drop them
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            session_id TEXT PRIMARY KEY,
+            upload_id TEXT,
+            object_key TEXT NOT NULL,
+            mime_type TEXT,
+            size_bytes INTEGER,
+            created_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS upload_parts (
+            session_id TEXT NOT NULL,
+            part_number INTEGER NOT NULL,
+            etag TEXT NOT NULL,
+            size INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (session_id, part_number)
+        )
+    ''')
+    # WAL lets concurrent workers read sessions while another records a part
+    conn.execute("PRAGMA journal_mode=WAL")
     conn.commit()
     conn.close()
 
@@ -115,6 +224,11 @@ init_contributors_db()
 
 def get_contributor_by_token(token: str) -> Optional[Dict[str, Any]]:
     """Look up contributor by upload token."""
+    with _CONTRIBUTOR_CACHE_LOCK:
+        cached = _CONTRIBUTOR_CACHE.get(token)
+    if cached:
+        return cached
+
     conn = get_contributors_db()
     row = conn.execute(
         "SELECT * FROM contributors WHERE token = ? AND status = 'active'",
@@ -123,11 +237,15 @@ def get_contributor_by_token(token: str) -> Optional[Dict[str, Any]]:
     conn.close()
 
     if row:
-        return {
+        info = {
             "display_name": row["display_name"],
             "folder_name": row["folder_name"],
             "email": row["email"],
         }
+        # Only active contributors are cached, so a newly created or verified token is seen at once
+        with _CONTRIBUTOR_CACHE_LOCK:
+            _CONTRIBUTOR_CACHE[token] = info
+        return info
     return None
 
 
@@ -251,11 +369,10 @@ def send_verification_email(email: str, display_name: str, verification_token: s
 
     # If SMTP not configured, just log the verification URL (dev mode)
     if not SMTP_HOST or not SMTP_USER:
-        print(f"\n{'='*50}")
-        print(f"VERIFICATION EMAIL (SMTP not configured)")
-        print(f"To: {email}")
-        print(f"Verification URL: {verification_url}")
-        print(f"{'='*50}\n")
+        logger.info(
+            "\n%s\nVERIFICATION EMAIL (SMTP not configured)\nTo: %s\nVerification URL: %s\n%s\n",
+            "=" * 50, email, verification_url, "=" * 50,
+        )
         return True
 
     try:
@@ -274,10 +391,186 @@ def send_verification_email(email: str, display_name: str, verification_token: s
 
         return True
     except Exception as e:
-        print(f"Failed to send verification email: {e}")
+        logger.error("Failed to send verification email: %s", e)
         return False
 
 
+def save_upload_session(session_id: str, session: Dict[str, Any]):
+    """Store an upload session; parts are recorded separately with record_upload_part."""
+    conn = get_contributors_db()
+    conn.execute('''
+        INSERT OR REPLACE INTO upload_sessions (session_id, upload_id, object_key, mime_type, size_bytes, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (session_id, session.get("upload_id"), session["object_key"], session.get("mime_type"),
+          session.get("size_bytes"), session["created_at"]))
+    conn.commit()
+    conn.close()
+
+
+def get_upload_session(session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Load an unexpired upload session with its recorded parts, or None."""
+    if not session_id:
+        return None
+    cutoff = (datetime.utcnow() - timedelta(seconds=UPLOAD_SESSION_TTL_SECONDS)).isoformat()
+    conn = get_contributors_db()
+    row = conn.execute(
+        "SELECT * FROM upload_sessions WHERE session_id = ? AND created_at > ?",
+        (session_id, cutoff)
+    ).fetchone()
+    conn.close()
+    if not row:
+        return None
+    session = dict(row)
+    session["parts"], session["bytes_received"] = get_upload_parts(session_id)
+    return session
+
+
+def get_upload_parts(session_id: str) -> Tuple[Dict[int, str], int]:
+    """Return the recorded parts of an upload as (part_number -> ETag, total bytes)."""
+    conn = get_contributors_db()
+    rows = conn.execute(
+        "SELECT part_number, etag, size FROM upload_parts WHERE session_id = ?",
+        (session_id,)
+    ).fetchall()
+    conn.close()
+    return {row["part_number"]: row["etag"] for row in rows}, sum(row["size"] for row in rows)
+
+
+def record_upload_part(session_id: str, part_number: int, etag: str, size: int) -> int:
+    """Record a part (a retried part replaces its row) and return the bytes received so far."""
+    conn = get_contributors_db()
+    conn.execute(
+        "INSERT OR REPLACE INTO upload_parts (session_id, part_number, etag, size) VALUES (?, ?, ?, ?)",
+        (session_id, part_number, etag, size)
+    )
+    conn.commit()
+    bytes_received = conn.execute(
+        "SELECT COALESCE(SUM(size), 0) FROM upload_parts WHERE session_id = ?", (session_id,)
+    ).fetchone()[0]
+    conn.close()
+    return bytes_received
+
+
+def claim_upload_session(session_id: str) -> bool:
+    """Delete an upload session, returning True only for the caller that removed it.
+
+    The DELETE is atomic across workers, so exactly one request gets to complete an upload.
+    Parts are kept so a failed completion can restore the session with save_upload_session.
+    """
+    conn = get_contributors_db()
+    claimed = conn.execute("DELETE FROM upload_sessions WHERE session_id = ?", (session_id,)).rowcount == 1
+    conn.commit()
+    conn.close()
+    return claimed
+
+
+def delete_upload_parts(session_id: str):
+    """Drop the recorded parts of a completed upload."""
+    conn = get_contributors_db()
+    conn.execute("DELETE FROM upload_parts WHERE session_id = ?", (session_id,))
+    conn.commit()
+    conn.close()
+
+
+def acquire_buffer(size: int) -> bytearray:
+    """Take a full-part buffer from the pool, or allocate one for any other size."""
+    if size == R2_PART_SIZE and _PART_BUFFERS:
+        return _PART_BUFFERS.pop()
+    return bytearray(size)
+
+
+def release_buffer(buf):
+    """Return a buffer from acquire_buffer once nothing references its contents."""
+    if isinstance(buf, bytearray) and len(buf) == R2_PART_SIZE and len(_PART_BUFFERS) < _PART_BUFFER_POOL_SIZE:
+        _PART_BUFFERS.append(buf)
+
+
+def expire_upload_sessions() -> int:
+    """Abort the R2 multipart uploads of sessions older than the TTL and drop their rows.
+
+    R2 keeps (and bills for) the parts of an abandoned multipart upload until it is aborted.
+    Returns the number of sessions expired.
+    """
+    cutoff = (datetime.utcnow() - timedelta(seconds=UPLOAD_SESSION_TTL_SECONDS)).isoformat()
+    conn = get_contributors_db()
+    rows = conn.execute(
+        "SELECT session_id, upload_id, object_key FROM upload_sessions WHERE created_at <= ?",
+        (cutoff,)
+    ).fetchall()
+    conn.close()
+
+    expired = 0
+    for row in rows:
+        # Another worker's reaper may have taken it already
+        if not claim_upload_session(row["session_id"]):
+            continue
+        if row["upload_id"]:
+            try:
+                get_r2_client().abort_multipart_upload(
+                    Bucket=R2_BUCKET_NAME,
+                    Key=row["object_key"],
+                    UploadId=row["upload_id"],
+                )
+            except Exception as e:
+                logger.error("[REAPER ERROR] %s: %s: %s", row["object_key"], type(e).__name__, e)
+        delete_upload_parts(row["session_id"])
+        expired += 1
+    return expired
+
+
+async def reap_upload_sessions():
+    """Background loop that expires abandoned upload sessions."""
+    while True:
+        await asyncio.sleep(UPLOAD_REAPER_INTERVAL_SECONDS)
+        try:
+            expired = await asyncio.to_thread(expire_upload_sessions)
+            if expired:
+                logger.info("[REAPER] Expired %d abandoned upload sessions", expired)
+        except Exception as e:
+            logger.error("[REAPER ERROR] %s: %s", type(e).__name__, e)
+
+
+@app.on_event("startup")
+async def start_upload_reaper():
+    app.state.upload_reaper = asyncio.create_task(reap_upload_sessions())
+
+
+@app.on_event("shutdown")
+async def stop_upload_reaper():
+    app.state.upload_reaper.cancel()
+
+
+async def read_body(request: Request) -> bytes | bytearray:
+    """Read an upload body into one buffer sized from Content-Length.
+
+    request.body() collects the received pieces in a list and joins them, so every
+    chunk briefly exists twice; filling a single preallocated buffer halves peak memory.
+    Pass the result to release_buffer when done with it.
+    """
+    try:
+        expected = int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        return await request.body()
+
+    # Every byte is overwritten below (short bodies are rejected), so a recycled buffer is safe
+    body = acquire_buffer(expected)
+    received = 0
+    try:
+        with memoryview(body) as view:
+            async for piece in request.stream():
+                end = received + len(piece)
+                if end > expected:
+                    raise HTTPException(status_code=400, detail="Body longer than Content-Length")
+                view[received:end] = piece
+                received = end
+        if received != expected:
+            raise HTTPException(status_code=400, detail="Incomplete request body")
+    except BaseException:
+        release_buffer(body)
+        raise
+    return body
+
+
 @app.middleware("http")
 async def rate_limit_middleware(request: Request, call_next):
     ip = request.client.host if request.client else "unknown"
@@ -285,7 +578,7 @@ async def rate_limit_middleware(request: Request, call_next):
     window = _RATE_LIMIT.get(ip, [])
     window = [t for t in window if now - t < 60]
     if len(window) >= RATE_LIMIT_PER_MIN:
-        return JSONResponse(status_code=429, content={"detail": "Too many requests"})
+        return APIResponse(status_code=429, content={"detail": "Too many requests"})
     window.append(now)
     _RATE_LIMIT[ip] = window
     return await call_next(request)
@@ -293,7 +586,7 @@ async def rate_limit_middleware(request: Request, call_next):
 
 # Startup validation
 if not R2_ACCOUNT_ID or not R2_ACCESS_KEY_ID or not R2_SECRET_ACCESS_KEY:
-    print("[WARNING] R2 credentials not configured. Set R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY")
+    logger.warning("[WARNING] R2 credentials not configured. Set R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY")
 
 
 # --- Root Redirect ---
@@ -411,29 +704,31 @@ async def api_batch_create(payload: Dict[str, Any]):
     if not info:
         raise HTTPException(status_code=404, detail="Invalid token")
 
-    batch_id = f"batch_{int(time.time())}_{token[:8]}"
+    batch_id = f"{_BATCH_PREFIX}_{next(_BATCH_COUNTER):08x}"
     return {"batch_id": batch_id, "created_at": datetime.utcnow().isoformat()}
 
 
 @app.post("/api/upload/init")
-async def api_upload_init(payload: Dict[str, Any]):
+def api_upload_init(payload: UploadInitRequest):
     """Initialize an upload - returns a presigned URL for direct upload to R2."""
-    token = payload.get("token")
-    batch_id = payload.get("batch_id")
-    filename = payload.get("filename")
-    mime_type = payload.get("mime_type") or "application/octet-stream"
-    size_bytes = int(payload.get("size_bytes") or 0)
+    token = payload.token
+    batch_id = payload.batch_id
+    filename = payload.filename
+    mime_type = payload.mime_type or "application/octet-stream"
+    size_bytes = payload.size_bytes
 
-    print(f"[INIT] Starting upload for {filename} ({size_bytes} bytes)")
+    logger.debug("[INIT] Starting upload for %s (%d bytes)", filename, size_bytes)
 
     if size_bytes > MAX_FILE_SIZE_BYTES:
         raise HTTPException(status_code=413, detail="File too large")
+    if size_bytes < 0 or not filename:
+        raise HTTPException(status_code=400, detail="filename and size_bytes are required")
 
     info = get_contributor_by_token(token)
     if not info:
         raise HTTPException(status_code=404, detail="Invalid token")
 
-    print(f"[INIT] Contributor: {info['display_name']}, folder: {info['folder_name']}")
+    logger.debug("[INIT] Contributor: %s, folder: %s", info["display_name"], info["folder_name"])
 
     try:
         s3 = get_r2_client()
@@ -443,10 +738,10 @@ async def api_upload_init(payload: Dict[str, Any]):
         safe_filename = re.sub(r'[^a-zA-Z0-9._-]', '_', filename)
         object_key = f"{info['folder_name']}/{timestamp}_{safe_filename}"
 
-        print(f"[INIT] Object key: {object_key}")
+        logger.info("[INIT] Object key: %s", object_key)
 
-        # For files larger than 5MB, use multipart upload
-        if size_bytes > 5 * 1024 * 1024:
+        # For files larger than one part, use multipart upload
+        if size_bytes > R2_PART_SIZE:
             # Start multipart upload
             response = s3.create_multipart_upload(
                 Bucket=R2_BUCKET_NAME,
@@ -457,15 +752,15 @@ async def api_upload_init(payload: Dict[str, Any]):
 
             # Store session info
             session_id = str(uuid.uuid4())
-            _UPLOAD_SESSIONS[session_id] = {
+            save_upload_session(session_id, {
                 "upload_id": upload_id,
                 "object_key": object_key,
+                "mime_type": mime_type,
                 "size_bytes": size_bytes,
-                "parts": [],
                 "created_at": datetime.utcnow().isoformat(),
-            }
+            })
 
-            print(f"[INIT] Multipart upload started: {upload_id}")
+            logger.debug("[INIT] Multipart upload started: %s", upload_id)
 
             return {
                 "batch_id": batch_id,
@@ -477,14 +772,14 @@ async def api_upload_init(payload: Dict[str, Any]):
         else:
             # For smaller files, use server-side upload to avoid CORS issues
             session_id = str(uuid.uuid4())
-            _UPLOAD_SESSIONS[session_id] = {
+            save_upload_session(session_id, {
                 "object_key": object_key,
                 "mime_type": mime_type,
                 "size_bytes": size_bytes,
                 "created_at": datetime.utcnow().isoformat(),
-            }
+            })
 
-            print(f"[INIT] Small file upload session created: {session_id}")
+            logger.debug("[INIT] Small file upload session created: %s", session_id)
 
             return {
                 "batch_id": batch_id,
@@ -495,7 +790,7 @@ async def api_upload_init(payload: Dict[str, Any]):
             }
 
     except Exception as e:
-        print(f"[INIT ERROR] {type(e).__name__}: {str(e)}")
+        logger.error("[INIT ERROR] %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Failed to initialize upload: {str(e)}")
 
 
@@ -505,11 +800,10 @@ async def api_get_part_url(payload: Dict[str, Any]):
     session_id = payload.get("upload_id")
     part_number = int(payload.get("part_number", 1))
 
-    if session_id not in _UPLOAD_SESSIONS:
+    session = get_upload_session(session_id)
+    if not session:
         raise HTTPException(status_code=404, detail="Upload session not found")
 
-    session = _UPLOAD_SESSIONS[session_id]
-
     try:
         s3 = get_r2_client()
 
@@ -530,7 +824,7 @@ async def api_get_part_url(payload: Dict[str, Any]):
         }
 
     except Exception as e:
-        print(f"[PART URL ERROR] {type(e).__name__}: {str(e)}")
+        logger.error("[PART URL ERROR] %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Failed to get part URL: {str(e)}")
 
 
@@ -540,55 +834,56 @@ async def api_complete_part(payload: Dict[str, Any]):
     session_id = payload.get("upload_id")
     part_number = int(payload.get("part_number", 1))
     etag = payload.get("etag")
+    size = int(payload.get("size") or 0)
 
-    if session_id not in _UPLOAD_SESSIONS:
+    if not get_upload_session(session_id):
         raise HTTPException(status_code=404, detail="Upload session not found")
 
-    session = _UPLOAD_SESSIONS[session_id]
-    session["parts"].append({
-        "PartNumber": part_number,
-        "ETag": etag,
-    })
+    bytes_received = record_upload_part(session_id, part_number, etag, size)
 
-    return {"status": "ok", "parts_uploaded": len(session["parts"])}
+    return {"status": "ok", "bytes_received": bytes_received}
 
 
 @app.post("/api/upload/complete-multipart")
-async def api_complete_multipart(payload: Dict[str, Any]):
+def api_complete_multipart(payload: Dict[str, Any]):
     """Complete a multipart upload."""
     session_id = payload.get("upload_id")
 
-    if session_id not in _UPLOAD_SESSIONS:
+    session = get_upload_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    # Don't assemble an object that is missing bytes (or has extra) from what init declared
+    if session["bytes_received"] != session["size_bytes"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Received {session['bytes_received']} of {session['size_bytes']} bytes",
+        )
+    if not claim_upload_session(session_id):
         raise HTTPException(status_code=404, detail="Upload session not found")
-
-    session = _UPLOAD_SESSIONS[session_id]
 
     try:
         s3 = get_r2_client()
 
-        # Sort parts by part number
-        parts = sorted(session["parts"], key=lambda p: p["PartNumber"])
-
         response = s3.complete_multipart_upload(
             Bucket=R2_BUCKET_NAME,
             Key=session["object_key"],
             UploadId=session["upload_id"],
-            MultipartUpload={"Parts": parts},
+            MultipartUpload={"Parts": multipart_parts(session)},
         )
+        delete_upload_parts(session_id)
 
-        # Clean up session
-        del _UPLOAD_SESSIONS[session_id]
-
-        print(f"[COMPLETE] Multipart upload completed: {session['object_key']}")
+        logger.info("[COMPLETE] Multipart upload completed: %s", session["object_key"])
 
         return {
             "status": "ok",
             "object_key": session["object_key"],
             "location": response.get("Location", ""),
+            "size": session["bytes_received"],
         }
 
     except Exception as e:
-        print(f"[COMPLETE ERROR] {type(e).__name__}: {str(e)}")
+        save_upload_session(session_id, session)
+        logger.error("[COMPLETE ERROR] %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Failed to complete upload: {str(e)}")
 
 
@@ -598,36 +893,49 @@ async def api_upload_simple(request: Request):
     session_id = request.headers.get("X-Upload-Id")
     content_type = request.headers.get("Content-Type") or "application/octet-stream"
 
-    if not session_id or session_id not in _UPLOAD_SESSIONS:
+    session = get_upload_session(session_id)
+    if not session:
         raise HTTPException(status_code=400, detail="Invalid or missing upload session")
+    # Multipart sessions may declare up to MAX_FILE_SIZE_BYTES, which read_body would buffer whole
+    if session.get("upload_id") or session["size_bytes"] > R2_PART_SIZE:
+        raise HTTPException(status_code=400, detail="Multipart upload sessions must use the chunk endpoint")
+    if request.headers.get("content-length") not in (None, str(session["size_bytes"])):
+        raise HTTPException(status_code=400, detail="Body size does not match the declared file size")
 
-    session = _UPLOAD_SESSIONS[session_id]
-    body = await request.body()
+    body = await read_body(request)
+    if len(body) != session["size_bytes"]:
+        release_buffer(body)
+        raise HTTPException(status_code=400, detail="Body size does not match the declared file size")
 
-    print(f"[SIMPLE] Uploading {len(body)} bytes to {session['object_key']}")
+    logger.debug("[SIMPLE] Uploading %d bytes to %s", len(body), session["object_key"])
 
     try:
         s3 = get_r2_client()
 
-        s3.put_object(
-            Bucket=R2_BUCKET_NAME,
-            Key=session["object_key"],
-            Body=body,
-            ContentType=session.get("mime_type", content_type),
-        )
+        try:
+            await asyncio.to_thread(
+                s3.put_object,
+                Bucket=R2_BUCKET_NAME,
+                Key=session["object_key"],
+                Body=body,
+                ContentType=session.get("mime_type") or content_type,
+            )
+        finally:
+            release_buffer(body)
 
         # Clean up session
-        del _UPLOAD_SESSIONS[session_id]
+        claim_upload_session(session_id)
 
-        print(f"[SIMPLE] Upload complete: {session['object_key']}")
+        logger.info("[SIMPLE] Upload complete: %s", session["object_key"])
 
-        return JSONResponse(content={
+        return APIResponse(content={
             "status": "complete",
             "object_key": session["object_key"],
+            "size": len(body),
         }, status_code=200)
 
     except Exception as e:
-        print(f"[SIMPLE ERROR] {type(e).__name__}: {str(e)}")
+        logger.error("[SIMPLE ERROR] %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
@@ -638,88 +946,93 @@ async def api_upload_chunk(request: Request):
     content_range = request.headers.get("Content-Range")
     content_type = request.headers.get("Content-Type") or "application/octet-stream"
 
-    if not session_id or session_id not in _UPLOAD_SESSIONS:
+    session = get_upload_session(session_id)
+    if not session:
         raise HTTPException(status_code=400, detail="Invalid or missing upload session")
 
-    session = _UPLOAD_SESSIONS[session_id]
-
-    # Parse content range to determine part number
+    # Parse content range once to determine part number
     # Format: bytes start-end/total
     try:
-        range_parts = content_range.split(" ")[1].split("/")
-        byte_range = range_parts[0]
-        total = int(range_parts[1])
+        byte_range, total_str = content_range.split(" ")[1].split("/")
         start, end = map(int, byte_range.split("-"))
-
-        # Calculate part number (5MB chunks)
-        chunk_size = 5 * 1024 * 1024
-        part_number = (start // chunk_size) + 1
+        total = int(total_str)
     except Exception:
-        part_number = len(session["parts"]) + 1
+        raise HTTPException(status_code=400, detail="Missing or malformed Content-Range")
+
+    # Reject a chunk that can't belong to this upload before reading its body
+    if total != session["size_bytes"]:
+        raise HTTPException(status_code=400, detail="Content-Range total does not match the declared file size")
+    if start >= total or start % R2_PART_SIZE or end != min(start + R2_PART_SIZE, total) - 1:
+        raise HTTPException(status_code=400, detail="Chunk is not aligned to the part size")
+    length = end - start + 1
+    if request.headers.get("content-length") not in (None, str(length)):
+        raise HTTPException(status_code=400, detail="Content-Length does not match Content-Range")
+    part_number = (start // R2_PART_SIZE) + 1
 
     try:
-        body = await request.body()
+        body = await read_body(request)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[CHUNK ERROR] Failed to read request body: {e}")
+        logger.error("[CHUNK ERROR] Failed to read request body: %s", e)
         raise HTTPException(status_code=400, detail=f"Failed to read chunk data: {str(e)}")
+    if len(body) != length:
+        release_buffer(body)
+        raise HTTPException(status_code=400, detail="Chunk size does not match Content-Range")
 
-    print(f"[CHUNK] Uploading part {part_number}, {len(body)} bytes for {session['object_key']}")
+    logger.debug("[CHUNK] Uploading part %d, %d bytes for %s", part_number, len(body), session["object_key"])
 
     try:
         s3 = get_r2_client()
 
-        response = s3.upload_part(
-            Bucket=R2_BUCKET_NAME,
-            Key=session["object_key"],
-            UploadId=session["upload_id"],
-            PartNumber=part_number,
-            Body=body,
-        )
+        try:
+            response = await asyncio.to_thread(
+                s3.upload_part,
+                Bucket=R2_BUCKET_NAME,
+                Key=session["object_key"],
+                UploadId=session["upload_id"],
+                PartNumber=part_number,
+                Body=body,
+            )
+        finally:
+            release_buffer(body)
 
         etag = response["ETag"]
-        session["parts"].append({
-            "PartNumber": part_number,
-            "ETag": etag,
-        })
+        bytes_received = record_upload_part(session_id, part_number, etag, length)
 
-        print(f"[CHUNK] Part {part_number} uploaded, ETag: {etag}")
+        logger.debug("[CHUNK] Part %d uploaded, ETag: %s", part_number, etag)
 
-        # Check if this is the last chunk
-        if content_range:
+        # Parts may arrive out of order (the uploader sends several at once), so complete
+        # once every byte is accounted for rather than when the final range arrives.
+        # Claiming the session first means a concurrent request can't complete it twice.
+        if bytes_received >= session["size_bytes"] and claim_upload_session(session_id):
+            # Re-read the parts: others may have been recorded by another worker
+            session["parts"], session["bytes_received"] = get_upload_parts(session_id)
             try:
-                _, total_str = content_range.split("/")
-                total = int(total_str)
-                _, end_str = content_range.split(" ")[1].split("/")[0].split("-")
-                end = int(end_str)
-
-                if end + 1 >= total:
-                    # This is the last chunk, complete the multipart upload
-                    parts = sorted(session["parts"], key=lambda p: p["PartNumber"])
-
-                    complete_response = s3.complete_multipart_upload(
-                        Bucket=R2_BUCKET_NAME,
-                        Key=session["object_key"],
-                        UploadId=session["upload_id"],
-                        MultipartUpload={"Parts": parts},
-                    )
-
-                    del _UPLOAD_SESSIONS[session_id]
-
-                    print(f"[COMPLETE] Upload finished: {session['object_key']}")
-
-                    return JSONResponse(content={
-                        "status": "complete",
-                        "object_key": session["object_key"],
-                    }, status_code=200)
-            except Exception as e:
-                print(f"[CHUNK] Error checking completion: {e}")
-
-        return JSONResponse(content={"status": "ok", "part_number": part_number}, status_code=200)
+                await asyncio.to_thread(
+                    s3.complete_multipart_upload,
+                    Bucket=R2_BUCKET_NAME,
+                    Key=session["object_key"],
+                    UploadId=session["upload_id"],
+                    MultipartUpload={"Parts": multipart_parts(session)},
+                )
+            except Exception:
+                save_upload_session(session_id, session)
+                raise
+            delete_upload_parts(session_id)
+
+            logger.info("[COMPLETE] Upload finished: %s", session["object_key"])
+
+            return APIResponse(content={
+                "status": "complete",
+                "object_key": session["object_key"],
+                "size": session["bytes_received"],
+            }, status_code=200)
+
+        return APIResponse(content={"status": "ok", "part_number": part_number}, status_code=200)
 
     except Exception as e:
-        print(f"[CHUNK ERROR] {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[CHUNK ERROR] %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Chunk upload failed: {str(e)}")
 
 
@@ -729,10 +1042,10 @@ async def api_upload_complete(payload: Dict[str, Any]):
 
 
 @app.post("/api/batch/finish")
-async def api_batch_finish(payload: Dict[str, Any]):
-    token = payload.get("token")
-    batch_id = payload.get("batch_id")
-    files = payload.get("files", [])
+def api_batch_finish(payload: BatchFinishRequest):
+    token = payload.token
+    batch_id = payload.batch_id
+    files = payload.files
 
     info = get_contributor_by_token(token)
     if not info:
@@ -741,17 +1054,23 @@ async def api_batch_finish(payload: Dict[str, Any]):
     if len(files) > MAX_FILES_PER_BATCH:
         raise HTTPException(status_code=400, detail="Too many files in batch")
 
+    # The uploader keeps a running byte total; only older clients need the per-file sum
+    total_bytes = payload.total_bytes
+    if total_bytes is None:
+        total_bytes = sum(f.size or 0 for f in files)
+
     # Save manifest to R2
     manifest = {
         "batch_id": batch_id,
         "contributor_token": token,
         "contributor_display_name": info["display_name"],
         "created_at": datetime.utcnow().isoformat(),
-        "decade": payload.get("decade"),
-        "event": payload.get("event"),
-        "notes": payload.get("notes"),
-        "files": files,
-        "voice_note": payload.get("voice_note"),
+        "decade": payload.decade,
+        "event": payload.event,
+        "notes": payload.notes,
+        "files": [f.model_dump(exclude_unset=True) for f in files],
+        "total_bytes": total_bytes,
+        "voice_note": payload.voice_note,
     }
 
     try:
@@ -760,12 +1079,12 @@ async def api_batch_finish(payload: Dict[str, Any]):
         s3.put_object(
             Bucket=R2_BUCKET_NAME,
             Key=manifest_key,
-            Body=json.dumps(manifest, indent=2),
+            Body=orjson.dumps(manifest, option=orjson.OPT_INDENT_2) if orjson else json.dumps(manifest, indent=2),
             ContentType="application/json",
         )
-        print(f"[MANIFEST] Saved: {manifest_key}")
+        logger.info("[MANIFEST] Saved: %s", manifest_key)
     except Exception as e:
-        print(f"[MANIFEST ERROR] {type(e).__name__}: {str(e)}")
+        logger.error("[MANIFEST ERROR] %s: %s", type(e).__name__, e)
         # Don't fail the batch if manifest save fails
 
     total = update_upload_count(token, len(files))
@@ -779,15 +1098,21 @@ async def api_batch_finish(payload: Dict[str, Any]):
 # --- Dashboard Endpoints ---
 
 DASHBOARD_PASSWORD = os.getenv("DASHBOARD_PASSWORD", "")  # Set this in Railway
+# Cookie values are fixed per deployment, so hash once instead of on every dashboard/gallery request
+DASHBOARD_AUTH_HASH = hashlib.sha256(DASHBOARD_PASSWORD.encode()).hexdigest()[:32]
+GALLERY_AUTH_HASH = hashlib.sha256(FAMILY_CODE.encode()).hexdigest()[:32]
+
+
+def matches_secret(value: Optional[str], expected: str) -> bool:
+    """Constant-time comparison, so response timing doesn't reveal how much of a secret matched."""
+    return isinstance(value, str) and hmac.compare_digest(value.encode(), expected.encode())
 
 
 def verify_dashboard_access(request: Request) -> bool:
     """Check if user has dashboard access via cookie."""
     if not DASHBOARD_PASSWORD:
         return True  # No password set, allow access
-    auth_cookie = request.cookies.get("dashboard_auth")
-    expected = hashlib.sha256(DASHBOARD_PASSWORD.encode()).hexdigest()[:32]
-    return auth_cookie == expected
+    return matches_secret(request.cookies.get("dashboard_auth"), DASHBOARD_AUTH_HASH)
 
 
 @app.get("/dashboard", response_class=HTMLResponse)
@@ -812,10 +1137,9 @@ async def dashboard_login(request: Request):
     form = await request.form()
     password = form.get("password", "")
 
-    if password == DASHBOARD_PASSWORD:
+    if matches_secret(password, DASHBOARD_PASSWORD):
         response = RedirectResponse(url="/dashboard", status_code=302)
-        auth_hash = hashlib.sha256(DASHBOARD_PASSWORD.encode()).hexdigest()[:32]
-        response.set_cookie("dashboard_auth", auth_hash, max_age=86400 * 7)  # 7 days
+        response.set_cookie("dashboard_auth", DASHBOARD_AUTH_HASH, max_age=86400 * 7)  # 7 days
         return response
 
     return TEMPLATES.TemplateResponse(
@@ -825,7 +1149,7 @@ async def dashboard_login(request: Request):
 
 
 @app.get("/api/dashboard/files")
-async def api_dashboard_files(request: Request):
+def api_dashboard_files(request: Request):
     """Get all files from R2 for the dashboard."""
     if not verify_dashboard_access(request):
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -870,12 +1194,12 @@ async def api_dashboard_files(request: Request):
         }
 
     except Exception as e:
-        print(f"[DASHBOARD ERROR] {type(e).__name__}: {str(e)}")
+        logger.error("[DASHBOARD ERROR] %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/dashboard/manifests")
-async def api_dashboard_manifests(request: Request):
+def api_dashboard_manifests(request: Request):
     """Get all batch manifests from R2."""
     if not verify_dashboard_access(request):
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -907,7 +1231,7 @@ async def api_dashboard_manifests(request: Request):
         return {"manifests": manifests, "total": len(manifests)}
 
     except Exception as e:
-        print(f"[MANIFESTS ERROR] {type(e).__name__}: {str(e)}")
+        logger.error("[MANIFESTS ERROR] %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -930,12 +1254,12 @@ async def api_dashboard_thumbnail(request: Request, file_key: str):
         return {"url": url}
 
     except Exception as e:
-        print(f"[THUMBNAIL ERROR] {type(e).__name__}: {str(e)}")
+        logger.error("[THUMBNAIL ERROR] %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/dashboard/stats")
-async def api_dashboard_stats(request: Request):
+def api_dashboard_stats(request: Request):
     """Get dashboard statistics."""
     if not verify_dashboard_access(request):
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -973,7 +1297,7 @@ async def api_dashboard_stats(request: Request):
         }
 
     except Exception as e:
-        print(f"[STATS ERROR] {type(e).__name__}: {str(e)}")
+        logger.error("[STATS ERROR] %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -983,9 +1307,7 @@ def verify_gallery_access(request: Request) -> bool:
     """Check if user has gallery access via cookie (using family code)."""
     if not FAMILY_CODE:
         return True  # No family code set, allow access
-    auth_cookie = request.cookies.get("gallery_auth")
-    expected = hashlib.sha256(FAMILY_CODE.encode()).hexdigest()[:32]
-    return auth_cookie == expected
+    return matches_secret(request.cookies.get("gallery_auth"), GALLERY_AUTH_HASH)
 
 
 @app.get("/gallery", response_class=HTMLResponse)
@@ -1010,10 +1332,9 @@ async def gallery_login(request: Request):
     form = await request.form()
     code = form.get("family_code", "")
 
-    if secrets.compare_digest(code, FAMILY_CODE):
+    if matches_secret(code, FAMILY_CODE):
         response = RedirectResponse(url="/gallery", status_code=302)
-        auth_hash = hashlib.sha256(FAMILY_CODE.encode()).hexdigest()[:32]
-        response.set_cookie("gallery_auth", auth_hash, max_age=86400 * 30)  # 30 days
+        response.set_cookie("gallery_auth", GALLERY_AUTH_HASH, max_age=86400 * 30)  # 30 days
         return response
 
     return TEMPLATES.TemplateResponse(
@@ -1023,7 +1344,7 @@ async def gallery_login(request: Request):
 
 
 @app.get("/api/gallery/photos")
-async def api_gallery_photos(request: Request):
+def api_gallery_photos(request: Request):
     """Get all photos for the gallery, organized by batch/event."""
     if not verify_gallery_access(request):
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -1102,7 +1423,7 @@ async def api_gallery_photos(request: Request):
         }
 
     except Exception as e:
-        print(f"[GALLERY ERROR] {type(e).__name__}: {str(e)}")
+        logger.error("[GALLERY ERROR] %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1115,12 +1436,9 @@ async def api_gallery_image(request: Request, file_key: str):
     try:
         # Check cache first to avoid R2 rate limiting
         cache_key = f"url:{file_key}"
-        now = time.time()
-
-        if cache_key in _URL_CACHE:
-            cached_url, cached_time = _URL_CACHE[cache_key]
-            if now - cached_time < _URL_CACHE_TTL:
-                return {"url": cached_url}
+        cached_url = _URL_CACHE.get(cache_key)
+        if cached_url:
+            return {"url": cached_url}
 
         s3 = get_r2_client()
 
@@ -1130,18 +1448,11 @@ async def api_gallery_image(request: Request, file_key: str):
             ExpiresIn=3600,
         )
 
-        # Cache the URL
-        _URL_CACHE[cache_key] = (url, now)
-
-        # Clean old cache entries periodically (every 100 requests)
-        if len(_URL_CACHE) > 500:
-            cutoff = now - _URL_CACHE_TTL
-            keys_to_delete = [k for k, (_, t) in _URL_CACHE.items() if t < cutoff]
-            for k in keys_to_delete:
-                del _URL_CACHE[k]
+        # Cache the URL; TTLCache drops it before the presigned URL expires
+        _URL_CACHE[cache_key] = url
 
         return {"url": url}
 
     except Exception as e:
-        print(f"[GALLERY IMAGE ERROR] {type(e).__name__}: {str(e)}")
+        logger.error("[GALLERY IMAGE ERROR] %s: %s", type(e).__name__, e)
         raise HTTPException(status_code=500, detail=str(e))
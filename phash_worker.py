@@ -6,6 +6,7 @@ import imagehash
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
+from duplicate_detection import refresh_duplicate_groups
 
 # --- CONFIGURATION ---
 DB_PATH = r'F:\FamilyArchive\data\archive.db'
@@ -14,7 +15,12 @@ SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 
 def get_drive_service():
     creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    return build('drive', 'v3', credentials=creds)
+    return build('drive', 'v3', credentials=creds, cache_discovery=False)
+
+def phash_to_int64(hash_val):
+    # SQLite INTEGER is signed, so the 64 hash bits are stored two's-complement
+    value = int(str(hash_val), 16)
+    return value - (1 << 64) if value >> 63 else value
 
 def get_db_connection():
     return sqlite3.connect(DB_PATH)
@@ -32,6 +38,10 @@ def process_phash():
     ''').fetchall()
     
     print(f"Found {len(items)} items to process for pHash.")
+
+    # phash_u64 only exists once fix_schema.py has run; writing it blindly would mark every row failed
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(media)")}
+    has_u64 = "phash_u64" in columns
     
     for drive_id, filename in items:
         print(f"Generating pHash for {filename}...")
@@ -52,7 +62,10 @@ def process_phash():
             hash_val = imagehash.phash(img)
             
             # Update database
-            cursor.execute("UPDATE media SET phash = ? WHERE drive_id = ?", (str(hash_val), drive_id))
+            if has_u64:
+                cursor.execute("UPDATE media SET phash = ?, phash_u64 = ? WHERE drive_id = ?", (str(hash_val), phash_to_int64(hash_val), drive_id))
+            else:
+                cursor.execute("UPDATE media SET phash = ? WHERE drive_id = ?", (str(hash_val), drive_id))
             conn.commit()
             
         except Exception as e:
@@ -63,6 +76,9 @@ def process_phash():
 
     conn.close()
     print("pHash processing complete.")
+    
+    # New hashes invalidated their cached groups; regroup so /duplicates stays a plain read
+    print(f"Stored {refresh_duplicate_groups()} duplicate groups.")
 
 if __name__ == "__main__":
     process_phash()
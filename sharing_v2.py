@@ -35,6 +35,7 @@ def ensure_share_links_table():
             view_count INTEGER DEFAULT 0,
             password_hash TEXT,
             password_salt TEXT,
+            password_algo TEXT,
             max_views INTEGER,
             allow_download BOOLEAN DEFAULT 0
         )
@@ -57,6 +58,7 @@ def upgrade_schema():
     new_columns = [
         ("password_hash", "TEXT"),
         ("password_salt", "TEXT"),
+        ("password_algo", "TEXT"),
         ("max_views", "INTEGER"),
         ("allow_download", "BOOLEAN DEFAULT 0"),
     ]
@@ -72,13 +74,19 @@ def upgrade_schema():
     conn.close()
 
 
-def hash_password(password, salt=None):
+# Must match the KDFs in dashboard_v11_video.py, which shares this table
+PASSWORD_ALGO = 'pbkdf2_sha256'
+
+
+def hash_password(password, salt=None, algo=PASSWORD_ALGO):
     """
-    Hash a password using PBKDF2-HMAC-SHA256.
+    Hash a password using PBKDF2-HMAC-SHA256 (or scrypt for links
+    created by the v11 dashboard).
 
     Args:
         password: The plaintext password
         salt: Optional salt (generated if not provided)
+        algo: 'pbkdf2_sha256' or 'scrypt'
 
     Returns:
         tuple: (hash_hex, salt_hex)
@@ -86,19 +94,35 @@ def hash_password(password, salt=None):
     if salt is None:
         salt = secrets.token_hex(16)
 
-    password_hash = hashlib.pbkdf2_hmac(
-        'sha256',
-        password.encode('utf-8'),
-        salt.encode('utf-8'),
-        100000  # iterations
-    ).hex()
+    if algo == 'scrypt':
+        password_hash = hashlib.scrypt(
+            password.encode('utf-8'),
+            salt=salt.encode('utf-8'),
+            n=2 ** 14,
+            r=8,
+            p=1,
+        ).hex()
+    elif algo == PASSWORD_ALGO:
+        password_hash = hashlib.pbkdf2_hmac(
+            'sha256',
+            password.encode('utf-8'),
+            salt.encode('utf-8'),
+            100000  # iterations
+        ).hex()
+    else:
+        raise ValueError(f"Unknown password algorithm: {algo}")
 
     return password_hash, salt
 
 
-def verify_password(password, stored_hash, stored_salt):
-    """Verify a password against stored hash and salt."""
-    computed_hash, _ = hash_password(password, stored_salt)
+def verify_password(password, stored_hash, stored_salt, algo=None):
+    """Verify a password against stored hash, salt and algorithm."""
+    try:
+        computed_hash, _ = hash_password(
+            password, stored_salt, algo or PASSWORD_ALGO
+        )
+    except ValueError:
+        return False
     return secrets.compare_digest(computed_hash, stored_hash)
 
 
@@ -136,8 +160,10 @@ def generate_share_link(
 
     password_hash = None
     password_salt = None
+    password_algo = None
     if password:
         password_hash, password_salt = hash_password(password)
+        password_algo = PASSWORD_ALGO
 
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -146,12 +172,13 @@ def generate_share_link(
         INSERT INTO share_links (
             token, name, created_date, expires_date, access_type,
             is_active, view_count, password_hash, password_salt,
-            max_views, allow_download
+            password_algo, max_views, allow_download
         )
-        VALUES (?, ?, ?, ?, ?, 1, 0, ?, ?, ?, ?)
+        VALUES (?, ?, ?, ?, ?, 1, 0, ?, ?, ?, ?, ?)
     ''', (
         token, name, created_date, expires_date, access_type,
-        password_hash, password_salt, max_views, 1 if allow_download else 0
+        password_hash, password_salt, password_algo, max_views,
+        1 if allow_download else 0
     ))
 
     conn.commit()
@@ -219,7 +246,8 @@ def verify_share_link(token, password=None):
         if not verify_password(
             password,
             link_dict['password_hash'],
-            link_dict.get('password_salt') or ''
+            link_dict.get('password_salt') or '',
+            link_dict.get('password_algo')
         ):
             conn.close()
             return {'requires_password': True, 'link': link_dict}
@@ -304,6 +332,9 @@ def update_share_link(token, **kwargs):
 
     Supported kwargs: name, expires_days, password, max_views, allow_download
     """
+    if 'password' in kwargs:
+        upgrade_schema()
+
     conn = get_db_connection()
 
     updates = []
@@ -326,11 +357,13 @@ def update_share_link(token, **kwargs):
     if 'password' in kwargs:
         if kwargs['password']:
             password_hash, password_salt = hash_password(kwargs['password'])
+            password_algo = PASSWORD_ALGO
         else:
-            password_hash, password_salt = None, None
+            password_hash, password_salt, password_algo = None, None, None
         updates.append('password_hash = ?')
         updates.append('password_salt = ?')
-        params.extend([password_hash, password_salt])
+        updates.append('password_algo = ?')
+        params.extend([password_hash, password_salt, password_algo])
 
     if 'max_views' in kwargs:
         updates.append('max_views = ?')